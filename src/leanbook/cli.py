@@ -1,8 +1,18 @@
 import argparse
+import asyncio
+import sqlite3
+import threading
+import time
+import traceback
 from pathlib import Path
 
+from jinja2 import TemplateError
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+from .lean_parser import Fail
 from .source_tree import SourceTree
-from .target_tree import TargetTree
+from .target_tree import InventoryError, TargetTree, parse_inventory_spec
 
 
 def parse_path(args):
@@ -15,16 +25,131 @@ def parse_path(args):
     return path, output
 
 
+def setup_target(target_tree: TargetTree, args):
+    target_tree.highlighter.native_lean = args.highlighter == "native"
+    target_tree.highlighter.default_language = args.fence_language
+    target_tree.base_url = args.base_url
+    target_tree.minify = args.minify
+    for inventory in args.inventory or []:
+        print(f"loaded {len(inventory)} symbols from {inventory.path}")
+        target_tree.ctx.add_inventory(inventory)
+
+
+def inventory_spec(spec):
+    """Open the inventory of `--inventory`, reporting errors as usage errors"""
+    try:
+        return parse_inventory_spec(spec)
+    except (InventoryError, OSError) as err:
+        raise argparse.ArgumentTypeError(str(err))
+
+
+def fence_language(name):
+    """A language pygments knows, for `--fence-language`"""
+    try:
+        get_lexer_by_name(name)
+    except ClassNotFound:
+        raise argparse.ArgumentTypeError(f"unknown language {name!r}")
+    return name
+
+
+def add_target_arguments(parser):
+    parser.add_argument(
+        "--highlighter",
+        choices=["pygments", "native"],
+        default="pygments",
+        help="how to highlight lean code",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="collapse the whitespace of html and css outputs",
+    )
+    parser.add_argument(
+        "--fence-language",
+        type=fence_language,
+        metavar="LANG",
+        help="language of code blocks without one, guessed by default",
+    )
+    parser.add_argument(
+        "--inventory",
+        "-i",
+        action="append",
+        type=inventory_spec,
+        metavar="PATH[=URL]",
+        help="link symbols listed in the inventory of another book, published at URL",
+    )
+    parser.add_argument(
+        "--base-url",
+        default="",
+        help="where the book is published, recorded in its own inventory",
+    )
+
+
 def build(args):
     path, output = parse_path(args)
     source_tree = SourceTree(path)
-    source_tree.build_tree()
     target_tree = TargetTree(source_tree, output)
-    target_tree.render_all(args.force_mathjax, args.with_source)
+    setup_target(target_tree, args)
+    target_tree.precompress = args.precompress
+    modules = None
+    if args.only:
+        modules = source_tree.build_partial(args.only, target_tree.linked_modules)
+        if not modules:
+            print("no module matches", " ".join(args.only))
+            return -1
+    else:
+        source_tree.build_tree()
+    target_tree.render_all(
+        args.force_mathjax, args.with_source, args.rebuild, modules=modules
+    )
+
+
+def rebuild_on_change(source_tree, target_tree, watcher):
+    for changed_paths in watcher.iter_batches():
+        start = time.perf_counter()
+        try:
+            changed = source_tree.update(changed_paths)
+            # the pages of the changed modules and their importers first
+            target_tree.render_all(first=source_tree.affected_modules(changed))
+        except (Fail, SyntaxError, ValueError, OSError, sqlite3.Error, TemplateError):
+            # keep watching, the next change may fix it
+            traceback.print_exc()
+            continue
+        elapsed = time.perf_counter() - start
+        print(f"rebuilt {len(changed)} changed modules in {elapsed:.3f}s")
 
 
 def serve(args):
-    print(args)
+    from .server import PageStore, PreviewServer
+    from .watcher import make_watcher
+
+    path, output = parse_path(args)
+    source_tree = SourceTree(path)
+    source_tree.build_tree()
+    target_tree = TargetTree(source_tree, output)
+    setup_target(target_tree, args)
+    target_tree.render_all()
+
+    # pages are served from memory, and updated as they are rebuilt
+    store = PageStore()
+    store.load_dir(output)
+    target_tree.listeners.append(store.put)
+    server = PreviewServer(store, args.host, args.port)
+
+    watcher = make_watcher(source_tree.watch_paths(), poll=args.poll)
+    print("watching", path, "with", type(watcher).__name__)
+    thread = threading.Thread(
+        target=rebuild_on_change,
+        args=(source_tree, target_tree, watcher),
+        daemon=True,
+    )
+    thread.start()
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
 
 
 def parse(args):
@@ -46,8 +171,14 @@ def main():
     sub_cmds = parser.add_subparsers(description="", title="available commands")
     serve_parser = sub_cmds.add_parser("serve", description="run an HTTP server")
     serve_parser.set_defaults(func=serve)
-    serve_parser.add_argument("path", default=".")
+    serve_parser.add_argument("path", default=".", nargs="?")
     serve_parser.add_argument("--output", "-o", default=None)
+    serve_parser.add_argument(
+        "--poll", action="count", default=0, help="poll for changes instead of inotify"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", "-p", type=int, default=8000)
+    add_target_arguments(serve_parser)
 
     build_parser = sub_cmds.add_parser("build", description="build html files")
     build_parser.set_defaults(func=build)
@@ -55,6 +186,29 @@ def main():
     build_parser.add_argument("--output", "-o", default=None)
     build_parser.add_argument("--with-source", "-s", action="count", default=0)
     build_parser.add_argument("--force-mathjax", "-f", action="count", default=0)
+    build_parser.add_argument(
+        "--rebuild",
+        "-B",
+        action="count",
+        default=0,
+        help="ignore the build manifest and regenerate every output",
+    )
+    build_parser.add_argument(
+        "--only",
+        action="append",
+        metavar="MODULE",
+        help="only render these modules (names or glob patterns) and shared assets",
+    )
+    build_parser.add_argument(
+        "--precompress",
+        nargs="?",
+        type=int,
+        const=9,
+        choices=range(1, 10),
+        metavar="LEVEL",
+        help="write .gz siblings of the text outputs, at gzip LEVEL (9 by default)",
+    )
+    add_target_arguments(build_parser)
 
     parse_parser = sub_cmds.add_parser("parse", description="parse a single file")
     parse_parser.set_defaults(func=parse)
@@ -135,6 +135,42 @@ class Mutual(Group):
 class Module(Group):
     type = "module"
     head_comment = None
+    # (pos, qualified name) of every named declaration, recorded while parsing
+    declarations: list[tuple[SourcePos, str]] | None = field(
+        default=None, compare=False, repr=False
+    )
+
+    def local_symbols(self):
+        """Symbols relative to the module"""
+        if self.declarations is not None:
+            return self.declarations
+        return [(pos, sym) for one in self.elements for pos, sym in one.symbols()]
+
+    def imports(self):
+        for one in self.elements:
+            if isinstance(one, Import):
+                yield one.name
+
+
+class ModuleContext(SourceContext):
+    """
+    Source context of a module.
+    It keeps the namespace stack, so declarations are recorded
+    with their qualified names in one pass.
+    """
+
+    def __init__(self, text: str, file_path: str | None = None):
+        super().__init__(text, file_path)
+        self.namespaces: list[str] = []
+        self.declarations: list[tuple[SourcePos, str]] = []
+
+    def declare(self, decl: Declaration):
+        if decl.name is None:
+            return
+        name = decl.name
+        if self.namespaces:
+            name = ".".join(self.namespaces) + "." + name
+        self.declarations.append((decl.pos, name))
 
 
 class UntilNextCommand(MonadicParser):
@@ -242,7 +278,11 @@ class CommandContentParser(MonadicParser):
             return result
         if cmd.content == "namespace":
             ident = yield lexer.identifier
+            if isinstance(ctx, ModuleContext):
+                ctx.namespaces.append(ident.content)
             result: Group = yield namespace_parser
+            if isinstance(ctx, ModuleContext):
+                ctx.namespaces.pop()
             result.pos = cmd.pos
             result.name = ident.content
             # check the next token is EOF or end
@@ -292,6 +332,12 @@ class GroupParser(MonadicParser):
     def __init__(self, group_class=Group):
         self.group_class = group_class
 
+    @staticmethod
+    def add(ctx, section: Group, element: Element):
+        section.append(element)
+        if isinstance(element, Declaration) and isinstance(ctx, ModuleContext):
+            ctx.declare(element)
+
     def do(self):
         ctx = yield get_ctx
         section = self.group_class(ctx.pos)
@@ -305,7 +351,7 @@ class GroupParser(MonadicParser):
             if isinstance(tk, token.DocString):
                 decl = yield decl_parser
                 decl.doc_string = tk.content
-                section.append(decl)
+                self.add(ctx, section, decl)
                 continue
             if isinstance(tk, token.TOCHint):
                 # We have found a TOC token
@@ -322,7 +368,7 @@ class GroupParser(MonadicParser):
             if isinstance(tk, token.DeclModifier):
                 decl = yield decl_parser
                 decl.modifier = tk.content
-                section.append(decl)
+                self.add(ctx, section, decl)
                 continue
             if isinstance(tk, token.Command):
                 scoped = False
@@ -341,7 +387,7 @@ class GroupParser(MonadicParser):
                 if scoped:
                     element.pos = pos
                     element.scoped = True
-                section.append(element)
+                self.add(ctx, section, element)
                 continue
             raise Fail(ctx, f"Expect command or module command, got {tk}")
         section.end_pos = ctx.pos
@@ -357,6 +403,9 @@ class ModuleParser(GroupParser):
     def __init__(self):
         super().__init__(Module)
 
+    def parse_str(self, text: str, file_path: str | None = None):
+        return self.parse(ModuleContext(text, file_path=file_path))
+
     def do(self):
         ctx = yield lexer.get_ctx
         pos = ctx.pos
@@ -371,6 +420,8 @@ class ModuleParser(GroupParser):
                 ctx.pos = pos
         m = yield from super().do()
         m.head_comment = head_comment
+        if isinstance(ctx, ModuleContext):
+            m.declarations = ctx.declarations
         return m
 
 
@@ -0,0 +1,358 @@
+"""A preview HTTP server serving the rendered book from memory"""
+
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+EVENTS_PATH = "/__leanbook__/events"
+
+LIVE_RELOAD_SCRIPT = b"""<script>
+(function () {
+    var source = new EventSource("%s");
+    source.addEventListener("change", function (event) {
+        // the page shown may have changed without reloading, see navigate.js
+        var here = location.pathname.endsWith("/") ? location.pathname + "index.html" : location.pathname;
+        if (event.data === here || event.data.endsWith(".css")) {
+            location.reload();
+        }
+    });
+})();
+</script>
+""" % EVENTS_PATH.encode()
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg")
+
+REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+}
+
+
+@dataclass()
+class Page:
+    data: bytes
+    content_type: str
+    etag: str
+    _gzip: bytes | None = None
+
+    @classmethod
+    def make(cls, rel_path: str, data: bytes):
+        content_type = mimetypes.guess_type(rel_path)[0] or "application/octet-stream"
+        # body fragments are swapped into a page that has the script
+        if content_type == "text/html" and not rel_path.endswith(".body.html"):
+            data = inject_live_reload(data)
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        etag = '"' + hashlib.sha1(data).hexdigest()[:20] + '"'
+        return cls(data, content_type, etag)
+
+    @property
+    def compressible(self):
+        return len(self.data) > 256 and self.content_type.startswith(COMPRESSIBLE)
+
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.data, compresslevel=6, mtime=0)
+        return self._gzip
+
+
+def inject_live_reload(data: bytes):
+    index = data.rfind(b"</body>")
+    if index < 0:
+        return data + LIVE_RELOAD_SCRIPT
+    return data[:index] + LIVE_RELOAD_SCRIPT + data[index:]
+
+
+class PageStore:
+    """
+    Rendered outputs in memory, keyed by their path relative to the output dir.
+    `put` may be called from the build thread. Listeners are told about changed pages.
+    """
+
+    def __init__(self):
+        self.pages: dict[str, Page] = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def load_dir(self, output_dir: str | Path):
+        output_dir = Path(output_dir)
+        for path in output_dir.rglob("*"):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            rel_path = path.relative_to(output_dir).as_posix()
+            self.pages[rel_path] = Page.make(rel_path, path.read_bytes())
+
+    def get(self, rel_path) -> Page | None:
+        return self.pages.get(rel_path, None)
+
+    def put(self, rel_path, data: bytes | None):
+        """Add or replace a page, or remove it if `data` is None"""
+        rel_path = Path(rel_path).as_posix()
+        if data is None:
+            self.remove(rel_path)
+            return
+        page = Page.make(rel_path, data)
+        with self.lock:
+            old = self.pages.get(rel_path, None)
+            if old is not None and old.etag == page.etag:
+                return
+            self.pages[rel_path] = page
+        for listener in self.listeners:
+            listener(rel_path)
+
+    def remove(self, rel_path):
+        with self.lock:
+            if self.pages.pop(rel_path, None) is None:
+                return
+        for listener in self.listeners:
+            listener(rel_path)
+
+
+def parse_range(value: str, size: int):
+    """Parse a single `bytes=start-end` range. Return (start, end) or None if invalid."""
+    unit, _, spec = value.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start == "":
+            # suffix range
+            length = int(end)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = size - 1 if end == "" else min(int(end), size - 1)
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def accepts_gzip(value: str):
+    """Whether an `Accept-Encoding` header gives gzip, or else `*`, a nonzero q"""
+    qualities = {}
+    for item in value.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, number = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+class Request:
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers: dict[str, str] = headers
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class PreviewServer:
+    """
+    HTTP/1.1 server for `leanbook serve`.
+
+    Pages are served from a `PageStore` with keep-alive, ETags, gzip and ranges.
+    Open tabs subscribe to server-sent events and reload when their page changes.
+    """
+
+    idle_timeout = 60
+    heartbeat = 15
+
+    def __init__(self, store: PageStore, host="127.0.0.1", port=8000):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.subscribers: set[asyncio.Queue] = set()
+        store.listeners.append(self.notify)
+
+    def notify(self, rel_path):
+        """Called from any thread when a page changes"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.broadcast, "/" + rel_path)
+
+    def broadcast(self, path):
+        for queue in self.subscribers:
+            queue.put_nowait(path)
+
+    async def serve_forever(self):
+        self.loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"serving on http://{self.host}:{self.port}/")
+        async with server:
+            await server.serve_forever()
+
+    async def read_request(self, reader: asyncio.StreamReader) -> Request | None:
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line:
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise ValueError("bad request line")
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+            line = line.decode("latin-1").strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        if length > 0:
+            await reader.readexactly(length)
+        return Request(*parts, headers)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    await self.respond(writer, 400, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                if request.method not in ("GET", "HEAD"):
+                    await self.respond(writer, 405, {"Allow": "GET, HEAD"})
+                    continue
+                path = unquote(urlsplit(request.target).path)
+                if path == EVENTS_PATH:
+                    await self.stream_events(writer)
+                    break
+                await self.serve_page(writer, request, path)
+                if not request.keep_alive:
+                    break
+        except (TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def lookup(self, path: str) -> Page | None:
+        rel_path = path.lstrip("/")
+        if rel_path == "" or rel_path.endswith("/"):
+            rel_path += "index.html"
+        if ".." in rel_path.split("/"):
+            return None
+        return self.store.get(rel_path)
+
+    async def serve_page(self, writer, request: Request, path: str):
+        page = self.lookup(path)
+        if page is None:
+            await self.respond(
+                writer, 404, body=b"not found", head=request.method == "HEAD"
+            )
+            return
+        headers = {
+            "Content-Type": page.content_type,
+            "Cache-Control": "no-cache",
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+        }
+        range_value = request.headers.get("range", None)
+        if_range = request.headers.get("if-range", None)
+        if range_value is not None and if_range is not None and if_range != page.etag:
+            range_value = None
+        # compressed and partial responses are not combined
+        use_gzip = (
+            range_value is None
+            and page.compressible
+            and accepts_gzip(request.headers.get("accept-encoding", ""))
+        )
+        etag = page.etag
+        if use_gzip:
+            etag = etag[:-1] + '-gz"'
+        headers["ETag"] = etag
+        if_none_match = request.headers.get("if-none-match", "")
+        if (
+            etag in [x.strip() for x in if_none_match.split(",")]
+            or if_none_match == "*"
+        ):
+            await self.respond(writer, 304, headers)
+            return
+        status = 200
+        if use_gzip:
+            body = page._gzip
+            if body is None:
+                # compress outside the event loop
+                body = await asyncio.get_running_loop().run_in_executor(None, page.gzip)
+            headers["Content-Encoding"] = "gzip"
+        else:
+            body = page.data
+            if range_value is not None:
+                size = len(body)
+                byte_range = parse_range(range_value, size)
+                if byte_range is None:
+                    headers["Content-Range"] = f"bytes */{size}"
+                    await self.respond(writer, 416, headers)
+                    return
+                start, end = byte_range
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                body = body[start : end + 1]
+        await self.respond(writer, status, headers, body, head=request.method == "HEAD")
+
+    @staticmethod
+    async def respond(
+        writer, status, headers=None, body=b"", head=False, keep_alive=True
+    ):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        headers = dict(headers or {})
+        if status != 304:
+            headers["Content-Length"] = str(len(body))
+        if not keep_alive:
+            headers["Connection"] = "close"
+        for key, value in headers.items():
+            lines.append(f"{key}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if not head and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    async def stream_events(self, writer: asyncio.StreamWriter):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+            b"retry: 1000\n\n"
+        )
+        await writer.drain()
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        try:
+            while True:
+                try:
+                    path = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except TimeoutError:
+                    writer.write(b": ping\n\n")
+                else:
+                    writer.write(f"event: change\ndata: {path}\n\n".encode())
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
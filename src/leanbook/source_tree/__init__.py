@@ -1,3 +1,6 @@
 from .file import SourceFile as SourceFile
 from .source_tree import SourceTree as SourceTree
-from .symbol_tree import SymbolTree as SymbolTree, TreePath as TreePath
+from .symbol_index import SymbolIndex as SymbolIndex, SymbolPos as SymbolPos
+from .import_graph import ImportGraph as ImportGraph, ImportCycle as ImportCycle
+from .symbol_db import SymbolDatabase as SymbolDatabase
+from .navigation import Navigation as Navigation, TOCHint as TOCHint
@@ -1,21 +1,64 @@
 """Source file"""
 
+import hashlib
 import os
 from pathlib import Path
-from ..lean_parser import Module, module_parser
+from ..lean_parser import Module, SourcePos, module_parser
 
 
 class SourceFile:
+    """
+    A lean file of the package.
+
+    Building the package only needs a summary of each file:
+    its declarations, imports and TOC hint.
+    The summary comes either from parsing the file,
+    or from the symbol database if the file is unchanged since it was stored there.
+    In the latter case, the module itself is only parsed when it is rendered.
+    """
+
     def __init__(self, path: str | Path, module_name=None):
         self.path = Path(path)
         self.module: Module | None = None
         self.module_name: str | None = module_name
+        self.digest: str | None = None
+        # the summary
+        self.declarations: list[tuple[SourcePos, str]] = []
+        self.imports: list[str] = []
+        self.toc_hint: list[tuple[str, str]] | None = None
+
+    @property
+    def is_loaded(self):
+        return self.digest is not None
 
     def update_time(self):
         return os.path.getmtime(self.path)
 
-    def read(self):
+    def read_text(self):
         with open(self.path) as file:
             content = file.read()
+        self.digest = hashlib.sha1(content.encode()).hexdigest()
+        return content
+
+    def parse(self, content):
         self.module = module_parser.parse_str(content, file_path=str(self.path))
         self.module.name = self.module_name
+        self.declarations = self.module.local_symbols()
+        self.imports = list(self.module.imports())
+        self.toc_hint = self.module.toc_hint
+
+    def read(self):
+        self.parse(self.read_text())
+
+    def load_summary(self, digest, declarations, imports, toc_hint):
+        self.module = None
+        self.digest = digest
+        self.declarations = declarations
+        self.imports = imports
+        self.toc_hint = toc_hint
+
+    def ensure_module(self) -> Module:
+        """Parse the module if only its summary is loaded"""
+        if self.module is None:
+            self.read()
+        return self.module
@@ -0,0 +1,120 @@
+"""Module import graph"""
+
+
+class ImportCycle(ValueError):
+    def __init__(self, cycle: list[str]):
+        super().__init__(f"import cycle: {' -> '.join(cycle)}")
+        self.cycle = cycle
+
+
+class ImportGraph:
+    """
+    Import edges between the modules of a package.
+    Imports of modules outside the package (e.g. `Mathlib`) are kept as edges,
+    but these modules never show up in the iteration.
+    """
+
+    def __init__(self):
+        self.imports: dict[str, list[str]] = {}
+        self.importers: dict[str, set[str]] = {}
+
+    def clear(self):
+        self.imports.clear()
+        self.importers.clear()
+
+    def __contains__(self, module_name):
+        return module_name in self.imports
+
+    def __len__(self):
+        return len(self.imports)
+
+    def add_module(self, module_name: str, imports):
+        """Add a module or replace its imports"""
+        self.remove_module(module_name)
+        imports = list(dict.fromkeys(imports))
+        self.imports[module_name] = imports
+        for one in imports:
+            self.importers.setdefault(one, set()).add(module_name)
+
+    def remove_module(self, module_name: str):
+        for one in self.imports.pop(module_name, ()):
+            self.importers[one].discard(module_name)
+
+    def dependencies(self, module_name: str):
+        """Direct imports of a module that are part of the package"""
+        return [x for x in self.imports.get(module_name, ()) if x in self.imports]
+
+    def dependents(self, module_names, transitive=True) -> set[str]:
+        """
+        Modules that import any of `module_names`.
+        These are the pages to re-render when the exported symbols change.
+        """
+        if isinstance(module_names, str):
+            module_names = [module_names]
+        result = set()
+        stack = list(module_names)
+        while stack:
+            name = stack.pop()
+            for one in self.importers.get(name, ()):
+                if one in result:
+                    continue
+                result.add(one)
+                if transitive:
+                    stack.append(one)
+        return result
+
+    def closure(self, module_names) -> set[str]:
+        """The modules together with everything they import, transitively"""
+        if isinstance(module_names, str):
+            module_names = [module_names]
+        result = set()
+        stack = [x for x in module_names if x in self.imports]
+        while stack:
+            name = stack.pop()
+            if name in result:
+                continue
+            result.add(name)
+            stack.extend(self.dependencies(name))
+        return result
+
+    def find_cycle(self) -> list[str] | None:
+        """Return a cycle like `[a, b, a]` if there is one"""
+        done = set()
+        for root in self.imports:
+            if root in done:
+                continue
+            path = [root]
+            on_path = {root}
+            stack = [iter(self.dependencies(root))]
+            while stack:
+                name = next(stack[-1], None)
+                if name is None:
+                    stack.pop()
+                    done.add(path[-1])
+                    on_path.discard(path.pop())
+                    continue
+                if name in on_path:
+                    return path[path.index(name) :] + [name]
+                if name in done:
+                    continue
+                path.append(name)
+                on_path.add(name)
+                stack.append(iter(self.dependencies(name)))
+        return None
+
+    def iter_ordered(self):
+        """Iterate over the modules, each one after everything it imports"""
+        pending = {name: len(self.dependencies(name)) for name in self.imports}
+        ready = [name for name, n in pending.items() if n == 0]
+        ready.reverse()
+        count = 0
+        while ready:
+            name = ready.pop()
+            count += 1
+            yield name
+            for one in sorted(self.importers.get(name, ()), reverse=True):
+                pending[one] -= 1
+                if pending[one] == 0:
+                    ready.append(one)
+        if count < len(pending):
+            raise ImportCycle(self.find_cycle())
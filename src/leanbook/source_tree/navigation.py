@@ -0,0 +1,112 @@
+"""Book navigation"""
+
+from dataclasses import dataclass
+
+
+@dataclass()
+class TOCHint:
+    up: str | None = None
+    prev: str | None = None
+    next: str | None = None
+
+
+class Navigation:
+    """
+    The structure of the book given by the `/-TOC-/` hints of its modules.
+    Modules are read depth first from the top modules, in the order of the TOCs;
+    prev and next follow this order, and up goes to the module listing one in its TOC.
+    """
+
+    def __init__(self):
+        # module -> the modules its TOC lists, if it has one
+        self.children: dict[str, list[str]] = {}
+        self.parent: dict[str, str] = {}
+        # titles given by the TOCs
+        self.titles: dict[str, str] = {}
+        # the reading order, and the position of each module in it
+        self.order: list[str] = []
+        self.position: dict[str, int] = {}
+        self.hints: dict[str, TOCHint] = {}
+
+    def clear(self):
+        self.children.clear()
+        self.parent.clear()
+        self.titles.clear()
+        self.order.clear()
+        self.position.clear()
+        self.hints.clear()
+
+    def build(self, modules, tocs: dict[str, list[tuple[str, str]]], roots=()):
+        """
+        `modules` are the names of every module of the book,
+        `tocs` the `(child, title)` lists of the modules having a TOC.
+        """
+        self.clear()
+        modules = list(modules)
+        for parent, toc in tocs.items():
+            self.children[parent] = [x[0] for x in toc]
+            for child, title in toc:
+                self.parent[child] = parent
+                self.titles[child] = title
+        known = set(modules)
+        starts = [x for x in roots if x in known]
+        # TOCs that are not listed in another one
+        starts += [x for x in modules if x in tocs and x not in self.parent]
+        for start in starts:
+            self.visit(start, known)
+        for i, name in enumerate(self.order):
+            self.position[name] = i
+        for name in modules:
+            self.hints[name] = self.make_hint(name)
+
+    def visit(self, start, known):
+        stack = [start]
+        while stack:
+            name = stack.pop()
+            if name in self.position or name not in known:
+                continue
+            self.position[name] = len(self.order)
+            self.order.append(name)
+            children = self.children.get(name, ())
+            stack.extend(x for x in reversed(children) if self.parent[x] == name)
+
+    def make_hint(self, name) -> TOCHint:
+        hint = TOCHint(up=self.parent.get(name, None))
+        i = self.position.get(name, None)
+        if i is None:
+            return hint
+        if i > 0:
+            hint.prev = self.order[i - 1]
+        if i < len(self.order) - 1:
+            hint.next = self.order[i + 1]
+        return hint
+
+    def get_hint(self, name) -> TOCHint:
+        hint = self.hints.get(name, None)
+        if hint is None:
+            # not a module of the book
+            hint = self.hints[name] = TOCHint(up=self.parent.get(name, None))
+        return hint
+
+    def breadcrumbs(self, name) -> list[str]:
+        """The modules above `name`, from the top"""
+        result = []
+        seen = {name}
+        parent = self.parent.get(name, None)
+        while parent is not None and parent not in seen:
+            result.append(parent)
+            seen.add(parent)
+            parent = self.parent.get(parent, None)
+        result.reverse()
+        return result
+
+    def iter_tree(self):
+        """`(depth, module)` in reading order"""
+        depth = {}
+        for name in self.order:
+            parent = self.parent.get(name, None)
+            depth[name] = depth[parent] + 1 if parent in depth else 0
+            yield depth[name], name
+
+    def title(self, name) -> str:
+        return self.titles.get(name, name)
@@ -1,19 +1,26 @@
 """Source tree"""
 
-from dataclasses import dataclass
+import fnmatch
 from pathlib import Path
 import tomllib
 
+from ..lean_parser import Fail
 from .file import SourceFile
-from .symbol_tree import SymbolTree
+from .import_graph import ImportCycle, ImportGraph
+from .navigation import Navigation
+from .symbol_db import SymbolDatabase
+from .symbol_index import SymbolIndex
 
 
 def iter_subtree(path: Path):
     one: Path
     for one in path.iterdir():
+        if one.name.startswith("."):
+            # editors' temporary files
+            continue
         if one.is_dir():
             yield from iter_subtree(one)
-        elif one.is_file() and one.with_suffix(".lean"):
+        elif one.is_file() and one.suffix == ".lean":
             yield one
 
 
@@ -35,20 +42,23 @@ def parse_module_name(rel_path: Path):
     return module_name
 
 
-@dataclass()
-class TOCHint:
-    up: str | None = None
-    prev: str | None = None
-    next: str | None = None
-
-
 class SourceTree:
     def __init__(self, path: str | Path):
         self.path = Path(path)
         self.top_modules: dict[Path, str] = {}
-        self.toc_hints: dict[str, TOCHint] = {}
+        self.navigation = Navigation()
         self.file_map: dict[Path, SourceFile] = {}
-        self.symbol_tree = SymbolTree()
+        self.symbol_index = SymbolIndex()
+        # module-relative symbol -> modules declaring it
+        self.declared_in: dict[str, list[str]] = {}
+        # changes whenever the symbols are rebuilt
+        self.symbols_version = 0
+        self.import_graph = ImportGraph()
+        self.symbol_db: SymbolDatabase | None = None
+
+    @property
+    def toc_hints(self):
+        return self.navigation.hints
 
     @property
     def lakefile_toml(self):
@@ -62,6 +72,22 @@ class SourceTree:
     def bib_path(self):
         return self.path / "references.bib"
 
+    @property
+    def cache_dir(self):
+        return self.path / ".lake" / "build" / "leanbook"
+
+    @property
+    def symbol_db_path(self):
+        return self.cache_dir / "symbols.sqlite"
+
+    def open_symbol_db(self):
+        if self.symbol_db is None:
+            self.symbol_db = SymbolDatabase(self.symbol_db_path)
+        return self.symbol_db
+
+    def save_symbol_db(self):
+        self.open_symbol_db().save(self)
+
     @property
     def dir_name(self):
         return self.path.absolute().name
@@ -74,12 +100,22 @@ class SourceTree:
             rel_path = file.relative_to(self.path)
             yield file, zip_dir / rel_path
 
-    def iter_files(self):
+    def lean_libs(self):
         with open(self.lakefile_toml) as file:
             lakefile = tomllib.loads(file.read())
-        dirs = lakefile["lean_lib"]
-        for one in dirs:
-            top_module = self.path / f"{one['name']}.lean"
+        return [one["name"] for one in lakefile["lean_lib"]]
+
+    def watch_paths(self):
+        """Paths whose changes affect the book"""
+        result = [self.lakefile_toml, self.license_path, self.bib_path]
+        for name in self.lean_libs():
+            result.append(self.path / f"{name}.lean")
+            result.append(self.path / name)
+        return result
+
+    def iter_files(self):
+        for name in self.lean_libs():
+            top_module = self.path / f"{name}.lean"
             if top_module.exists():
                 rel_path = top_module.relative_to(self.path)
                 module_name = parse_module_name(rel_path)
@@ -88,7 +124,9 @@ class SourceTree:
                     rel_path,
                     SourceFile(top_module.absolute(), module_name=module_name),
                 )
-            dir_path = self.path / one["name"]
+            dir_path = self.path / name
+            if not dir_path.is_dir():
+                continue
             for file_path in iter_subtree(dir_path):
                 rel_path = file_path.relative_to(self.path)
                 yield (
@@ -100,55 +138,206 @@ class SourceTree:
 
     def scan_files(self):
         self.file_map.clear()
+        self.top_modules.clear()
         file: SourceFile
         for rel_path, file in self.iter_files():
             self.file_map[rel_path] = file
 
+    def load_file(self, file: SourceFile, stored: dict[str, str]) -> bool:
+        """
+        Load the summary of a file from the symbol database if it is unchanged,
+        otherwise parse it. Return whether it was parsed.
+        """
+        content = file.read_text()
+        if stored.get(file.module_name, None) == file.digest:
+            summary = self.symbol_db.load_summary(file.module_name)
+            if summary is not None and summary[0] == file.digest:
+                file.load_summary(*summary)
+                return False
+        file.parse(content)
+        return True
+
     def read_files(self):
-        for file in self.file_map.values():
-            file.read()
+        stored = self.open_symbol_db().digests()
+        parsed = sum(self.load_file(file, stored) for file in self.file_map.values())
+        print(f"parsed {parsed} of {len(self.file_map)} modules")
 
-    def build_symbols(self):
-        self.symbol_tree.clear()
+    def iter_read_files(self):
+        """Files that have been parsed. All of them, unless this is a partial build."""
         for rel_path, file in self.file_map.items():
-            module = file.module
-            self.symbol_tree.add(rel_path, module.name, None)
-            for pos, symbol in file.module.symbols():
-                self.symbol_tree.add(rel_path, symbol, pos)
-
-    def build_toc_hint(self):
-        self.toc_hints.clear()
-        children_lists = {}
-        # make empty hints
-        for file in self.file_map.values():
-            self.toc_hints.setdefault(file.module_name, TOCHint())
-        # we first find parents and children
-        for file in self.file_map.values():
-            toc = file.module.toc_hint
-            if toc is None:
+            if file.is_loaded:
+                yield rel_path, file
+
+    def build_symbols(self):
+        self.symbol_index.clear()
+        self.declared_in.clear()
+        for rel_path, file in self.iter_read_files():
+            name = file.module_name
+            self.symbol_index.add(rel_path, name, None)
+            self.symbol_index.extend(rel_path, name, file.declarations)
+            for _, symbol in file.declarations:
+                self.declared_in.setdefault(symbol, []).append(name)
+        self.symbol_index.freeze()
+        self.symbols_version += 1
+
+    def build_imports(self):
+        self.import_graph.clear()
+        for _, file in self.iter_read_files():
+            self.import_graph.add_module(file.module_name, file.imports)
+        cycle = self.import_graph.find_cycle()
+        if cycle is not None:
+            print("warning: import cycle", " -> ".join(cycle))
+
+    def iter_ordered_files(self, first=()):
+        """
+        Iterate over files in dependency order, i.e., imports come first,
+        with the modules in `first` before the others.
+        Files outside the import graph, or in a cycle, come last.
+        """
+        files = {
+            file.module_name: (rel_path, file)
+            for rel_path, file in self.file_map.items()
+        }
+        try:
+            order = list(self.import_graph.iter_ordered())
+        except ImportCycle:
+            order = []
+        first = set(first)
+        order.sort(key=lambda x: x not in first)
+        for module_name in dict.fromkeys(order + list(files)):
+            if module_name in files:
+                yield files[module_name]
+
+    def affected_modules(self, module_names) -> set[str]:
+        """
+        Modules whose pages may change when the exported symbols of
+        `module_names` change: the modules themselves and their importers.
+        """
+        return set(module_names) | self.import_graph.dependents(module_names)
+
+    def build_toc_hint(self, tocs=None):
+        """Build the navigation, from the TOCs of the read files and `tocs`"""
+        tocs = dict(tocs or {})
+        for _, file in self.iter_read_files():
+            if file.toc_hint is not None:
+                tocs[file.module_name] = file.toc_hint
+        modules = [file.module_name for file in self.file_map.values()]
+        self.navigation.build(modules, tocs, self.top_modules.values())
+
+    def get_toc_hint(self, module_name):
+        return self.navigation.get_hint(module_name)
+
+    def update(self, changed_paths) -> set[str]:
+        """
+        Rescan the package after the files in `changed_paths` have changed.
+        Only new and changed files are parsed again.
+        Return the names of the modules that were added, changed or removed.
+        """
+        changed_paths = {Path(x).absolute() for x in changed_paths}
+        old_map = self.file_map
+        self.file_map = {}
+        self.top_modules.clear()
+        changed = set()
+        for rel_path, file in self.iter_files():
+            old_file = old_map.pop(rel_path, None)
+            if old_file is not None and old_file.path not in changed_paths:
+                self.file_map[rel_path] = old_file
                 continue
-            children_lists[file.module_name] = [x[0] for x in toc]
-            for child, _ in toc:
-                self.toc_hints[child].up = file.module_name
-        # the prev and next
+            try:
+                file.read()
+            except (Fail, SyntaxError, OSError) as err:
+                print("failed to parse", rel_path, err)
+                if old_file is None:
+                    continue
+                file = old_file
+            self.file_map[rel_path] = file
+            changed.add(file.module_name)
+        # removed modules
+        changed.update(file.module_name for file in old_map.values())
+        if changed:
+            self.build_symbols()
+            self.build_imports()
+            self.build_toc_hint()
+            self.save_symbol_db()
+        return changed
+
+    def match_modules(self, patterns) -> set[str]:
+        """Module names matching any of the names or glob patterns"""
+        names = [file.module_name for file in self.file_map.values()]
+        result = set()
+        for pattern in patterns:
+            result.update(fnmatch.filter(names, pattern))
+        return result
+
+    def load_tocs(self) -> dict[str, list[tuple[str, str]]]:
+        """
+        The TOCs of the unread modules, which the navigation of every page needs.
+        They come from the symbol database, as of the last build reading them.
+        Modules missing there are searched as text, and loaded if they have a TOC,
+        without their imports.
+        """
+        symbol_db = self.open_symbol_db()
+        stored = symbol_db.digests()
+        tocs = symbol_db.load_tocs()
+        result = {}
         for file in self.file_map.values():
-            hint = self.toc_hints[file.module_name]
-            parent = hint.up
-            siblings = children_lists.get(parent, None)
-            if siblings is None:
+            name = file.module_name
+            if file.is_loaded:
                 continue
-            # must be true
-            index = siblings.index(file.module_name)
-            if index > 0:
-                hint.prev = siblings[index - 1]
-            if index < len(siblings) - 1:
-                hint.next = siblings[index + 1]
+            if name in stored:
+                if name in tocs:
+                    result[name] = tocs[name]
+            elif "/-TOC-/" in file.path.read_text():
+                self.load_file(file, stored)
+        return result
 
-    def get_toc_hint(self, module_name):
-        return self.toc_hints[module_name]
+    def read_modules(self, module_names, follow_imports=True) -> set[str]:
+        """
+        Load the modules, and everything they import with `follow_imports`.
+        Return the loaded names.
+        """
+        stored = self.open_symbol_db().digests()
+        files = {file.module_name: file for file in self.file_map.values()}
+        stack = [x for x in module_names if x in files]
+        result = set()
+        while stack:
+            name = stack.pop()
+            if name in result:
+                continue
+            result.add(name)
+            file = files[name]
+            if not file.is_loaded:
+                self.load_file(file, stored)
+            if follow_imports:
+                stack.extend(x for x in file.imports if x in files)
+        return result
+
+    def build_partial(self, patterns, linked_modules=None) -> list[Path]:
+        """
+        Parse only what the selected modules need, for `leanbook build --only`:
+        their imports, and `linked_modules(selected)` without their imports,
+        which should give the modules defining symbols the selected pages link to.
+        The TOCs of the other modules are loaded by `load_tocs`.
+        Return the relative paths of the selected modules.
+        """
+        self.scan_files()
+        selected = self.match_modules(patterns)
+        self.read_modules(selected)
+        if linked_modules is not None:
+            self.read_modules(linked_modules(selected), follow_imports=False)
+        tocs = self.load_tocs()
+        loaded = sum(1 for _ in self.iter_read_files())
+        print(f"loaded {loaded} of {len(self.file_map)} modules")
+        self.build_symbols()
+        self.build_imports()
+        self.build_toc_hint(tocs)
+        self.save_symbol_db()
+        return [x for x, f in self.file_map.items() if f.module_name in selected]
 
     def build_tree(self):
         self.scan_files()
         self.read_files()
         self.build_symbols()
+        self.build_imports()
         self.build_toc_hint()
+        self.save_symbol_db()
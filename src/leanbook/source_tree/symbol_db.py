@@ -0,0 +1,157 @@
+"""Symbol database"""
+
+import json
+import sqlite3
+from pathlib import Path
+
+from ..lean_parser import SourcePos
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    rel_path TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    toc TEXT
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    name TEXT NOT NULL,
+    local_name TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    offset INTEGER NOT NULL,
+    line INTEGER NOT NULL,
+    col INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols(name);
+CREATE INDEX IF NOT EXISTS symbols_local_name ON symbols(local_name);
+CREATE INDEX IF NOT EXISTS symbols_namespace ON symbols(namespace);
+CREATE INDEX IF NOT EXISTS symbols_module ON symbols(module_id);
+CREATE TABLE IF NOT EXISTS imports (
+    module_id INTEGER NOT NULL REFERENCES modules(id) ON DELETE CASCADE,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS imports_module ON imports(module_id);
+CREATE INDEX IF NOT EXISTS imports_name ON imports(name);
+"""
+
+
+class SymbolDatabase:
+    """
+    A SQLite file with the symbols, modules, TOCs and import edges of a package.
+
+    Later builds restore the summary of unchanged files from it instead of parsing them.
+    Other tools may query it directly, e.g.,
+    `SELECT m.name FROM symbols s JOIN modules m ON s.module_id = m.id WHERE s.name = ?`.
+    Symbol names are fully qualified, i.e., prefixed by the module name,
+    and `namespace` is the name without its last component.
+    """
+
+    version = "2"
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # `leanbook serve` rebuilds in the watcher thread, never concurrently
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.check_version()
+        self.conn.executescript(SCHEMA)
+
+    def check_version(self):
+        try:
+            row = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is not None and row[0] == self.version:
+            return
+        with self.conn:
+            # toc_hints was dropped in version 2, the hints follow from the TOCs
+            for table in ["symbols", "imports", "toc_hints", "modules", "meta"]:
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(
+                "INSERT INTO meta(key, value) VALUES ('version', ?)", (self.version,)
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def digests(self) -> dict[str, str]:
+        """module name -> digest of the source it was stored from"""
+        rows = self.conn.execute("SELECT name, digest FROM modules")
+        return dict(rows)
+
+    def load_tocs(self) -> dict[str, list[tuple[str, str]]]:
+        """module name -> TOC hint, for the stored modules having one"""
+        rows = self.conn.execute("SELECT name, toc FROM modules WHERE toc IS NOT NULL")
+        return {name: [tuple(x) for x in json.loads(toc)] for name, toc in rows}
+
+    def load_summary(self, module_name):
+        """Return `(digest, declarations, imports, toc_hint)` or None"""
+        row = self.conn.execute(
+            "SELECT id, digest, toc FROM modules WHERE name = ?", (module_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        module_id, digest, toc = row
+        declarations = [
+            (SourcePos(offset, line, col), local_name)
+            for local_name, offset, line, col in self.conn.execute(
+                "SELECT local_name, offset, line, col FROM symbols "
+                "WHERE module_id = ? ORDER BY rowid",
+                (module_id,),
+            )
+        ]
+        imports = [
+            x
+            for (x,) in self.conn.execute(
+                "SELECT name FROM imports WHERE module_id = ? ORDER BY rowid",
+                (module_id,),
+            )
+        ]
+        toc_hint = None
+        if toc is not None:
+            toc_hint = [tuple(x) for x in json.loads(toc)]
+        return digest, declarations, imports, toc_hint
+
+    def store_module(self, rel_path, file):
+        """Replace the rows of one module. Call within a transaction."""
+        conn = self.conn
+        conn.execute("DELETE FROM modules WHERE name = ?", (file.module_name,))
+        toc = None if file.toc_hint is None else json.dumps(file.toc_hint)
+        cursor = conn.execute(
+            "INSERT INTO modules(name, rel_path, digest, toc) VALUES (?, ?, ?, ?)",
+            (file.module_name, str(rel_path), file.digest, toc),
+        )
+        module_id = cursor.lastrowid
+        rows = []
+        for pos, local_name in file.declarations:
+            name = f"{file.module_name}.{local_name}"
+            namespace = name.rpartition(".")[0]
+            rows.append(
+                (name, local_name, namespace, module_id, pos.index, pos.line, pos.col)
+            )
+        conn.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO imports VALUES (?, ?)", [(module_id, x) for x in file.imports]
+        )
+
+    def save(self, source_tree):
+        """Store the modules whose source changed, and drop the removed ones"""
+        stored = self.digests()
+        with self.conn:
+            # files left unread by a partial build keep their rows
+            names = {file.module_name for file in source_tree.file_map.values()}
+            for rel_path, file in source_tree.iter_read_files():
+                if stored.get(file.module_name, None) != file.digest:
+                    self.store_module(rel_path, file)
+            for name in stored.keys() - names:
+                self.conn.execute("DELETE FROM modules WHERE name = ?", (name,))
@@ -0,0 +1,199 @@
+"""Symbol index"""
+
+import bisect
+import pickle
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Any
+
+from ..lean_parser import SourcePos
+
+# larger than any character in a name, used to bound prefix ranges
+MAX_CHAR = "\U0010ffff"
+
+
+@dataclass()
+class SymbolPos:
+    rel_path: Any
+    source_pos: SourcePos = None
+
+
+class SymbolIndex:
+    """
+    Fully qualified symbol names in a sorted list,
+    with parallel arrays for the file id and the source position.
+
+    Symbols are appended in bulk and sorted once, before the first lookup.
+    A symbol added twice keeps its last position.
+    Lookups are binary searches, and so are prefix and namespace enumerations.
+    """
+
+    def __init__(self):
+        self.files: list[Any] = []
+        self.file_ids: dict[Any, int] = {}
+        self.names: list[str] = []
+        self.file_of = array("i")
+        # -1 for symbols without a position, e.g., modules
+        self.offsets = array("q")
+        self.lines = array("i")
+        self.cols = array("i")
+        self.is_sorted = True
+
+    def __len__(self):
+        self.freeze()
+        return len(self.names)
+
+    def clear(self):
+        self.__init__()
+
+    def file_id(self, rel_path):
+        result = self.file_ids.get(rel_path, None)
+        if result is None:
+            result = len(self.files)
+            self.files.append(rel_path)
+            self.file_ids[rel_path] = result
+        return result
+
+    def add(self, rel_path, symbol: str, pos: SourcePos | None):
+        self.names.append(sys.intern(symbol))
+        self.file_of.append(self.file_id(rel_path))
+        if pos is None:
+            self.offsets.append(-1)
+            self.lines.append(0)
+            self.cols.append(0)
+        else:
+            self.offsets.append(pos.index)
+            self.lines.append(pos.line)
+            self.cols.append(pos.col)
+        self.is_sorted = False
+
+    def extend(self, rel_path, prefix: str, symbols):
+        """Add `(pos, name)` pairs, all declared in one file, as `prefix.name`"""
+        file_id = self.file_id(rel_path)
+        for pos, symbol in symbols:
+            self.names.append(sys.intern(f"{prefix}.{symbol}"))
+            self.file_of.append(file_id)
+            self.offsets.append(pos.index)
+            self.lines.append(pos.line)
+            self.cols.append(pos.col)
+        self.is_sorted = False
+
+    def freeze(self):
+        """Sort the arrays by name and drop overridden duplicates"""
+        if self.is_sorted:
+            return
+        names = self.names
+        order = sorted(range(len(names)), key=names.__getitem__)
+        # keep the last one of equal names (the sort is stable)
+        order = [
+            i
+            for k, i in enumerate(order)
+            if k + 1 == len(order) or names[order[k + 1]] != names[i]
+        ]
+        self.names = [names[i] for i in order]
+        self.file_of = array("i", (self.file_of[i] for i in order))
+        self.offsets = array("q", (self.offsets[i] for i in order))
+        self.lines = array("i", (self.lines[i] for i in order))
+        self.cols = array("i", (self.cols[i] for i in order))
+        self.is_sorted = True
+
+    def index_of(self, symbol: str) -> int:
+        self.freeze()
+        i = bisect.bisect_left(self.names, symbol)
+        if i < len(self.names) and self.names[i] == symbol:
+            return i
+        return -1
+
+    def entry(self, i) -> SymbolPos:
+        pos = None
+        if self.offsets[i] >= 0:
+            pos = SourcePos(self.offsets[i], self.lines[i], self.cols[i])
+        return SymbolPos(self.files[self.file_of[i]], pos)
+
+    def find(self, symbol: str) -> SymbolPos | None:
+        i = self.index_of(symbol)
+        if i < 0:
+            return None
+        return self.entry(i)
+
+    def __contains__(self, symbol):
+        return self.index_of(symbol) >= 0
+
+    def prefix_range(self, prefix: str):
+        self.freeze()
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + MAX_CHAR, lo=start)
+        return start, end
+
+    def iter_prefix(self, prefix: str):
+        """Names starting with `prefix`, in order"""
+        start, end = self.prefix_range(prefix)
+        return iter(self.names[start:end])
+
+    def iter_namespace(self, namespace: str):
+        """
+        Direct children of a namespace, e.g., `A.b` and `A.C` for `A`,
+        whether they are declarations or namespaces only.
+        """
+        prefix = f"{namespace}." if namespace else ""
+        start, end = self.prefix_range(prefix)
+        names = self.names
+        # the names under the children seen, which siblings such as `A.x!` or
+        # `A.x'` sort before, as `!` and `'` come before `.`; the nearest is last
+        pending = []
+        i = start
+        while i < end:
+            if pending and pending[-1][0] == i:
+                i = pending.pop()[1]
+                continue
+            child = names[i][len(prefix) :].partition(".")[0]
+            yield prefix + child
+            lo = bisect.bisect_left(names, f"{prefix}{child}.", lo=i, hi=end)
+            hi = bisect.bisect_left(names, f"{prefix}{child}.{MAX_CHAR}", lo=lo, hi=end)
+            if lo == i:
+                i = hi
+                continue
+            if lo < hi:
+                pending.append((lo, hi))
+            i += 1
+
+    def iter_declared(self, rel_path):
+        """Names declared in a file"""
+        file_id = self.file_ids.get(rel_path, None)
+        self.freeze()
+        for i, one in enumerate(self.file_of):
+            if one == file_id:
+                yield self.names[i]
+
+    def dumps(self) -> bytes:
+        """A compact snapshot, e.g., for worker processes"""
+        self.freeze()
+        state = (
+            self.files,
+            self.names,
+            self.file_of.tobytes(),
+            self.offsets.tobytes(),
+            self.lines.tobytes(),
+            self.cols.tobytes(),
+        )
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def loads(cls, data: bytes):
+        files, names, file_of, offsets, lines, cols = pickle.loads(data)
+        result = cls()
+        result.files = files
+        result.file_ids = {x: i for i, x in enumerate(files)}
+        result.names = [sys.intern(x) for x in names]
+        result.file_of.frombytes(file_of)
+        result.offsets.frombytes(offsets)
+        result.lines.frombytes(lines)
+        result.cols.frombytes(cols)
+        return result
+
+    def __getstate__(self):
+        return self.dumps()
+
+    def __setstate__(self, state):
+        self.__dict__.update(self.loads(state).__dict__)
@@ -1,3 +1,9 @@
 """Target tree"""
 
 from .target_tree import TargetTree as TargetTree
+from .inventory import (
+    Inventory as Inventory,
+    InventoryError as InventoryError,
+    dump_inventory as dump_inventory,
+    parse_inventory_spec as parse_inventory_spec,
+)
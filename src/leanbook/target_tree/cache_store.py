@@ -0,0 +1,116 @@
+"""Content addressed caches kept in memory and on disk"""
+
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+
+from .stats import BuildStats
+
+
+class CacheStore:
+    """
+    Strings by key, kept in memory with LRU eviction, and in a SQLite table
+    across builds, where the entries unused for the longest time are dropped
+    beyond `disk_size`.
+    Lookups are counted as `{name}.hit`, `{name}.miss` and `{name}.disk`.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None,
+        name: str,
+        stats=None,
+        memory_size=4096,
+        disk_size=1 << 16,
+    ):
+        self.path = None if path is None else Path(path)
+        self.name = name
+        self.stats = stats or BuildStats()
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        # keys used and entries added since the last save
+        self.used: set[str] = set()
+        self.added: dict[str, str] = {}
+        self.db = None
+        self.generation = 0
+
+    def open_db(self):
+        if self.db is not None or self.path is None:
+            return self.db
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # `leanbook serve` rebuilds in the watcher thread, never concurrently
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.name} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, used INTEGER NOT NULL)"
+        )
+        self.db.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.name}_used ON {self.name}(used)"
+        )
+        row = self.db.execute(f"SELECT MAX(used) FROM {self.name}").fetchone()
+        self.generation = (row[0] or 0) + 1
+        return self.db
+
+    def get(self, key) -> str | None:
+        result = self.cache.get(key, None)
+        if result is not None:
+            self.cache.move_to_end(key)
+            self.stats.count(f"{self.name}.hit")
+        else:
+            result = self.load(key)
+            if result is None:
+                self.stats.count(f"{self.name}.miss")
+                return None
+            self.stats.count(f"{self.name}.hit")
+            self.stats.count(f"{self.name}.disk")
+            self.remember(key, result)
+        self.used.add(key)
+        return result
+
+    def put(self, key, value: str):
+        self.added[key] = value
+        self.used.add(key)
+        self.remember(key, value)
+
+    def remember(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.memory_size:
+            self.cache.popitem(last=False)
+
+    def load(self, key) -> str | None:
+        db = self.open_db()
+        if db is None:
+            return None
+        row = db.execute(
+            f"SELECT value FROM {self.name} WHERE key = ?", (key,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def save(self):
+        """Store the new entries, and drop the least recently used ones"""
+        db = self.open_db()
+        if db is None:
+            return
+        with db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO {self.name} VALUES (?, ?, ?)",
+                [(k, v, self.generation) for k, v in self.added.items()],
+            )
+            db.executemany(
+                f"UPDATE {self.name} SET used = ? WHERE key = ?",
+                [(self.generation, k) for k in self.used if k not in self.added],
+            )
+            db.execute(
+                f"DELETE FROM {self.name} WHERE key IN "
+                f"(SELECT key FROM {self.name} ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.disk_size,),
+            )
+        self.added.clear()
+        self.used.clear()
+        self.generation += 1
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
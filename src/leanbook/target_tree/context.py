@@ -1,25 +1,170 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
 from ..source_tree import SourceTree
+from .inventory import Inventory
+
+
+OpenName = re.compile(r"^[^\W\d][\w.'!?]*$")
+
+
+@dataclass(frozen=True)
+class Scope:
+    """
+    Where a symbol is referred to:
+    the module, the enclosing namespaces and the opened namespaces.
+    """
+
+    module: str | None = None
+    namespaces: tuple[str, ...] = ()
+    opens: tuple[str, ...] = ()
+
+    @property
+    def signature(self) -> str:
+        return f"{self.module or ''}|{'.'.join(self.namespaces)}|{' '.join(self.opens)}"
+
+    @classmethod
+    def from_signature(cls, signature: str):
+        module, namespaces, opens = signature.split("|")
+        namespaces = tuple(namespaces.split(".")) if namespaces else ()
+        return cls(module or None, namespaces, tuple(opens.split()))
+
+    def candidates(self, symbol):
+        """
+        Module-relative names `symbol` may refer to, in Lean's order:
+        from the innermost namespace to the root, then through opened namespaces.
+        """
+        namespaces = self.namespaces
+        prefixes = [namespaces[:i] for i in range(len(namespaces), -1, -1)]
+        for prefix in prefixes:
+            yield ".".join(prefix + (symbol,))
+        for opened in reversed(self.opens):
+            for prefix in prefixes:
+                yield ".".join(prefix + (opened, symbol))
 
 
 class DocumentContext:
+    cache_size = 1 << 14
+
     def __init__(self, source_tree: SourceTree):
         self.source_tree = source_tree
-        self.ctx_stack = []
+        # one frame for each module, namespace, section and mutual
+        # each frame is (number of namespace components, opened names)
+        self.ctx_stack: list[tuple[int, list[str]]] = []
+        self.scope = Scope()
+        # "signature|symbol" -> link, for every symbol resolved on the current page
+        self.lookups: dict[str, str | None] = {}
+        self.lookup = lru_cache(maxsize=self.cache_size)(self.lookup_uncached)
+        self.symbols_version = None
+        # inventories of other books and libraries, for symbols not found here
+        self.inventories: list[Inventory] = []
 
-    def parse_symbol(self, symbol):
-        pass
+    def reset(self):
+        self.ctx_stack.clear()
+        self.scope = Scope()
+        self.lookups.clear()
 
-    def push_scope(self, name):
-        self.ctx_stack.append([])
+    def push_scope(self, name, scope_type=None, add_to_scope=False):
+        if scope_type == "module":
+            self.scope = Scope(module=name)
+            self.ctx_stack.append((0, []))
+            return
+        parts = ()
+        if add_to_scope and name is not None:
+            parts = tuple(name.split("."))
+        self.ctx_stack.append((len(parts), []))
+        self.scope = Scope(
+            self.scope.module, self.scope.namespaces + parts, self.scope.opens
+        )
 
     def pop_scope(self):
-        self.ctx_stack.pop()
+        size, names = self.ctx_stack.pop()
+        namespaces = self.scope.namespaces
+        if size:
+            namespaces = namespaces[:-size]
+        opens = self.scope.opens
+        if names:
+            opens = tuple(x for frame in self.ctx_stack for x in frame[1])
+            opens = tuple(dict.fromkeys(opens))
+        self.scope = Scope(self.scope.module, namespaces, opens)
 
-    def resolve(self, symbol):
-        symbol_tree = self.source_tree.symbol_tree
-        result = symbol_tree.find(symbol)
+    def open(self, names):
+        names = [x for x in names if OpenName.match(x) and x not in ("in", "scoped")]
+        if not self.ctx_stack:
+            self.ctx_stack.append((0, []))
+        self.ctx_stack[-1][1].extend(names)
+        opens = tuple(dict.fromkeys(self.scope.opens + tuple(names)))
+        self.scope = Scope(self.scope.module, self.scope.namespaces, opens)
+
+    def imported(self, module_name) -> set[str]:
+        return self.source_tree.import_graph.closure(module_name)
+
+    def pick_module(self, scope: Scope, modules: list[str]):
+        """Prefer the current module, then the imported ones"""
+        if scope.module in modules:
+            return scope.module
+        if len(modules) > 1 and scope.module is not None:
+            imported = self.imported(scope.module)
+            for one in modules:
+                if one in imported:
+                    return one
+        return modules[0]
+
+    def find(self, name):
+        """The link to a fully qualified name"""
+        result = self.source_tree.symbol_index.find(name)
         if result is None:
             return None
         rel_path = result.rel_path
         module = self.source_tree.file_map[rel_path]
-        return f"{module.module_name}.html", result.source_pos
+        url = f"{module.module_name}.html"
+        if result.source_pos is None:
+            return url
+        return f"{url}#{name}"
+
+    def lookup_uncached(self, scope: Scope, symbol: str) -> str | None:
+        declared = self.source_tree.declared_in
+        for name in scope.candidates(symbol):
+            modules = declared.get(name, None)
+            if modules:
+                return self.find(f"{self.pick_module(scope, modules)}.{name}")
+        # a fully qualified name, or a module
+        link = self.find(symbol)
+        if link is None and self.inventories:
+            link = self.find_external(scope, symbol)
+        return link
+
+    def find_external(self, scope: Scope, symbol: str) -> str | None:
+        for name in scope.candidates(symbol):
+            for inventory in self.inventories:
+                link = inventory.find(name)
+                if link is not None:
+                    return link
+        return None
+
+    def add_inventory(self, inventory: Inventory):
+        self.inventories.append(inventory)
+        self.lookup.cache_clear()
+
+    def check_version(self):
+        version = self.source_tree.symbols_version
+        if version != self.symbols_version:
+            self.lookup.cache_clear()
+            self.symbols_version = version
+
+    def probe(self, key):
+        """The link of a recorded lookup, or None. Nothing is recorded."""
+        self.check_version()
+        module, namespaces, opens, symbol = key.split("|", 3)
+        scope = Scope.from_signature(f"{module}|{namespaces}|{opens}")
+        return self.lookup(scope, symbol)
+
+    def resolve(self, symbol, scope: Scope | None = None) -> str | None:
+        """Resolve `symbol` in `scope` (the current one by default) to a link"""
+        self.check_version()
+        if scope is None:
+            scope = self.scope
+        link = self.lookup(scope, symbol)
+        self.lookups[f"{scope.signature}|{symbol}"] = link
+        return link
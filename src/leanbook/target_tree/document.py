@@ -1,8 +1,9 @@
+import bisect
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from ..lean_parser import module
-from .context import DocumentContext
+from .context import DocumentContext, Scope
 from .md_render import MDRender, parse_md
 
 
@@ -49,23 +50,63 @@ class TOC:
 @dataclass()
 class DocElement:
     content: str
+    # the scope symbols in this element are resolved in
+    scope: Scope | None = field(default=None, kw_only=True)
 
     def render_md(self) -> str:
         pass
 
     def render_html(self, renderer) -> str:
         md = self.render_md()
+        renderer.element = self
+        renderer.scope = self.scope
         html = renderer.render(parse_md(md))
         return html
 
+    def key_parts(self) -> list:
+        """What the html of the element depends on, besides the links it uses"""
+        scope = None if self.scope is None else self.scope.signature
+        return [type(self).__name__, self.content, scope]
+
+    def merge(self, *others):
+        self.content = "\n".join([self.content, *(x.content for x in others)])
+
 
 @dataclass()
 class LeanCode(DocElement):
-    def render_md(self) -> str:
+    # scopes changing within merged code, as (offset, scope)
+    scopes: list[tuple[int, Scope]] = field(default_factory=list, kw_only=True)
+    # declarations, as (offset, name, anchor)
+    anchors: list[tuple[int, str, str]] = field(default_factory=list, kw_only=True)
+
+    def __post_init__(self):
         # remove solutions
-        content = remove_solution(self.content)
-        code = f"```lean-source\n{content}\n```"
-        return code
+        self.content = remove_solution(self.content)
+
+    def render_html(self, renderer) -> str:
+        return renderer.render_lean_code(self)
+
+    def key_parts(self) -> list:
+        parts = super().key_parts()
+        parts += [f"{i}|{x.signature}" for i, x in self.scopes]
+        parts += [f"{i}|{x}|{y}" for i, x, y in self.anchors]
+        return parts
+
+    def merge(self, *others):
+        offset = len(self.content) + 1
+        for another in others:
+            if another.scope != self.scope_at(offset):
+                self.scopes.append((offset, another.scope))
+            self.scopes.extend((offset + i, x) for i, x in another.scopes)
+            self.anchors.extend((offset + i, x, y) for i, x, y in another.anchors)
+            offset += len(another.content) + 1
+        super().merge(*others)
+
+    def scope_at(self, offset) -> Scope | None:
+        i = bisect.bisect_right(self.scopes, offset, key=lambda x: x[0])
+        if i == 0:
+            return self.scope
+        return self.scopes[i - 1][1]
 
 
 @dataclass()
@@ -84,30 +125,72 @@ class Header(DocElement):
         level = self.level
         return f'<a href="#{anchor}"><h{level}>{self.name}</h{level}></a>'
 
+    def key_parts(self) -> list:
+        return super().key_parts() + [self.name, self.level]
+
 
 class Document:
-    def __init__(self, ctx: DocumentContext):
+    def __init__(self, ctx: DocumentContext, renderer: MDRender = None):
         self.ctx = ctx
-        self.html = ""
+        # the html, in pieces
+        self.parts: list[str] = []
         self.toc = TOC()
-        self.renderer = MDRender(self.ctx, self.toc)
+        if renderer is None:
+            renderer = MDRender(self.ctx)
+        self.renderer = renderer
+        renderer.start_document(self.toc)
         self.top_module_toc = TOC()
+        # for the search index
+        self.declarations: list[tuple[str, str]] = []
+        self.comments: list[str] = []
+        # what the page needs, see `MDRender.use`
+        self.features: set[str] = set()
+
+    @property
+    def html(self) -> str:
+        return "".join(self.parts)
 
     def add_elements(self, stream):
-        for one in self.merge_elements(self.iter_elements(stream)):
-            self.html += one.render_html(self.renderer)
+        elements = self.with_scope(self.iter_elements(stream))
+        self.parts.append(self.render_elements(list(self.merge_elements(elements))))
+
+    def render_elements(self, elements: list[DocElement]) -> str:
+        """
+        Render the elements with one renderer, parsing the markdown of each one.
+        Elements without markdown, or with a cached fragment, are not parsed.
+        """
+        cached = self.renderer.set_elements(elements)
+        documents = []
+        for i, one in enumerate(elements):
+            md = None if i in cached else one.render_md()
+            documents.append(None if md is None else self.renderer.parse_element(md))
+        html = self.renderer.render_elements(documents)
+        self.features |= self.renderer.features
+        return html
+
+    def with_scope(self, iterable):
+        """
+        Record the scope of each element when it is produced,
+        since elements are rendered only after the following one is read.
+        """
+        for one in iterable:
+            one.scope = self.ctx.scope
+            yield one
 
     @staticmethod
     def merge_elements(iterable):
-        prev_one = next(iterable)
+        """Merge the runs of elements of the same type, each with a single join"""
+        run: list[DocElement] = []
         one: DocElement
         for one in iterable:
-            if isinstance(one, type(prev_one)):
-                prev_one.content += "\n" + one.content
-            else:
-                yield prev_one
-                prev_one = one
-        yield prev_one
+            if run and not isinstance(one, type(run[0])):
+                run[0].merge(*run[1:])
+                yield run[0]
+                run.clear()
+            run.append(one)
+        if run:
+            run[0].merge(*run[1:])
+            yield run[0]
 
     def iter_elements(self, stream):
         element: module.Element
@@ -116,15 +199,15 @@ class Document:
                 yield LeanCode(f"{element.content}")
                 continue
             if isinstance(element, module.Import):
+                # imports are tracked by `SourceTree.import_graph`
                 yield LeanCode(f"import {element.name}")
-                # TODO: add to context
                 continue
             if isinstance(element, module.Open):
+                self.ctx.open(element.names)
                 yield LeanCode(f"\nopen {' '.join(element.names)}\n")
-                # TODO: add to context
                 continue
             if isinstance(element, module.PushScope):
-                self.ctx.push_scope(element.name)
+                self.ctx.push_scope(element.name, element.type, element.add_to_scope)
                 if element.type != "module":
                     yield LeanCode(f"{element.type} {element.name or ''}\n".strip())
                 continue
@@ -138,9 +221,15 @@ class Document:
                 content = element.content
                 # remove '/-!' and '-/'
                 content = content[3:-2]
+                self.comments.append(content)
                 yield ModuleMarkdown(content)
                 continue
             if isinstance(element, module.Declaration):
+                anchors = []
+                if element.name is not None:
+                    name = ".".join(self.ctx.scope.namespaces + (element.name,))
+                    self.declarations.append((name, element.doc_string))
+                    anchors.append((0, element.name, f"{self.ctx.scope.module}.{name}"))
                 code = ""
                 if element.doc_string != "":
                     code += code + "\n"
@@ -150,7 +239,7 @@ class Document:
                 if element.scoped:
                     scoped = "scoped "
                 code += f"{scoped}{element.type} {element.name or ''}{element.body}\n"
-                decl = LeanCode(code)
+                decl = LeanCode(code, anchors=anchors)
                 yield decl
                 continue
             if isinstance(element, module.Code):
@@ -0,0 +1,82 @@
+"""Rendered html of document elements, cached across builds"""
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .cache_store import CacheStore
+from .context import DocumentContext
+from .manifest import fingerprint
+from .stats import BuildStats
+
+
+@dataclass()
+class Fragment:
+    html: str
+    # entries the element added to the table of contents
+    toc: list[tuple[int, str, str]] = field(default_factory=list)
+    # "signature|symbol" -> link, for every symbol the element resolved
+    resolutions: dict[str, str | None] = field(default_factory=dict)
+    # what the page needs for the element, see `MDRender.use`
+    features: set[str] = field(default_factory=set)
+
+
+class FragmentCache:
+    """
+    Fragments by the text of their element and the links of the symbols it used.
+
+    The symbols an element resolves only depend on its text,
+    so they are stored by the text alone, and probed again before each lookup.
+    A changed link elsewhere in the book gives another key,
+    which invalidates exactly the fragments using it.
+    """
+
+    version = "2"
+    memory_size = 4096
+    disk_size = 1 << 15
+
+    def __init__(self, cache_path: str | Path | None, ctx: DocumentContext, stats=None):
+        self.ctx = ctx
+        self.stats = stats or BuildStats()
+        # anything else the html depends on, such as the templates and highlighter
+        self.salt = ""
+        # text key -> the symbols used, in their own table with uncounted lookups
+        self.uses = CacheStore(
+            cache_path, "fragment_uses", None, self.memory_size, self.disk_size
+        )
+        self.fragments = CacheStore(
+            cache_path, "fragments", self.stats, self.memory_size, self.disk_size
+        )
+
+    def key(self, *parts) -> str:
+        """The text key of an element"""
+        return fingerprint(self.version, self.salt, *parts)
+
+    def full_key(self, key, resolutions: dict[str, str | None]) -> str:
+        return fingerprint(key, *(f"{k}={v}" for k, v in resolutions.items()))
+
+    def get(self, key) -> Fragment | None:
+        uses = self.uses.get(key)
+        if uses is None:
+            self.stats.count("fragments.miss")
+            return None
+        resolutions = {x: self.ctx.probe(x) for x in json.loads(uses)}
+        value = self.fragments.get(self.full_key(key, resolutions))
+        if value is None:
+            return None
+        html, toc, features = json.loads(value)
+        return Fragment(html, [tuple(x) for x in toc], resolutions, set(features))
+
+    def put(self, key, fragment: Fragment):
+        resolutions = dict(sorted(fragment.resolutions.items()))
+        self.uses.put(key, json.dumps(list(resolutions)))
+        value = json.dumps([fragment.html, fragment.toc, sorted(fragment.features)])
+        self.fragments.put(self.full_key(key, resolutions), value)
+
+    def save(self):
+        self.uses.save()
+        self.fragments.save()
+
+    def close(self):
+        self.uses.close()
+        self.fragments.close()
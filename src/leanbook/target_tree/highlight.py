@@ -0,0 +1,206 @@
+"""Syntax highlighting"""
+
+import html
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import pygments
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name, guess_lexer
+from pygments.token import Name
+
+from ..lean_parser import token
+from . import lean_highlight
+from .cache_store import CacheStore
+from .lean_highlight import highlight_lean
+from .manifest import fingerprint
+from .stats import BuildStats
+
+# an identifier at an offset of the code is highlighted as
+# "\x00{offset}\x02{escaped identifier}\x01", to be linked after highlighting
+NamePattern = re.compile("\x00(\\d+)\x02([^\x01]*)\x01")
+MarkChars = ("\x00", "\x01", "\x02")
+LeanLexers = ("lean", "lean4")
+LeanCommands = frozenset(token.Command.names)
+# what Lean code has, and most other languages don't
+LeanMarks = re.compile(r":=|=>|[→←↔∀∃λ⟨⟩ℕℤ∧∨¬≤≥≠]|\b(?:fun|by|theorem|Prop|Type)\b")
+
+
+def looks_like_lean(content: str) -> bool:
+    """
+    Whether the code has a Lean mark (`:=`, `=>`, unicode symbols, `fun`, `by`,
+    `Prop`...) and a line starting with a command, or at least two marks.
+    """
+    marks = len(LeanMarks.findall(content))
+    if marks == 0:
+        return False
+    if marks >= 2:
+        return True
+    for line in content.splitlines():
+        words = line.split(maxsplit=1)
+        if words and words[0] in LeanCommands:
+            return True
+    return False
+
+
+@lru_cache(maxsize=4096)
+def guess_language(content: str) -> str:
+    """
+    "lean" for code that looks like Lean, which is much cheaper to tell than
+    trying every pygments lexer, else the guess of pygments. Memoized by content.
+    """
+    if looks_like_lean(content):
+        return "lean"
+    lexer = guess_lexer(content)
+    return lexer.aliases[0] if lexer.aliases else "text"
+
+
+class MarkingFormatter(HtmlFormatter):
+    """An `HtmlFormatter` marking identifiers with their offsets"""
+
+    def format(self, tokensource, outfile):
+        return super().format(self.mark_names(tokensource), outfile)
+
+    @staticmethod
+    def mark_names(tokensource):
+        offset = 0
+        for ttype, value in tokensource:
+            if ttype is Name:
+                yield ttype, f"\x00{offset}\x02{value}\x01"
+            else:
+                yield ttype, value
+            offset += len(value)
+
+
+def link_names(marked: str, link=None, anchors=()) -> str:
+    """
+    Replace the marks of identifiers in highlighted code.
+
+    `link(offset, name)` gives the link of the identifier at `offset`, or None.
+    `anchors` are sorted `(offset, name, anchor)` triples,
+    giving the first identifier `name` after `offset` the id `anchor`.
+    """
+    if link is None and not anchors:
+        return NamePattern.sub(r"\2", marked)
+    i = 0
+
+    def replace(match):
+        nonlocal i
+        offset = int(match[1])
+        text = match[2]
+        name = html.unescape(text)
+        # skip the anchors whose name was not found
+        while i + 1 < len(anchors) and anchors[i + 1][0] <= offset:
+            i += 1
+        anchor = None
+        if i < len(anchors) and anchors[i][0] <= offset and anchors[i][1] == name:
+            anchor = anchors[i][2]
+            i += 1
+        href = None if link is None else link(offset, name)
+        if href is None and anchor is None:
+            return text
+        attrs = ""
+        if anchor is not None:
+            attrs += f' id="{html.escape(anchor)}"'
+            href = href or f"#{anchor}"
+        return f'<a{attrs} href="{html.escape(href)}">{text}</a>'
+
+    return NamePattern.sub(replace, marked)
+
+
+class Highlighter:
+    """
+    Highlights code with pygments, with identifiers marked for `link_names`.
+
+    Results are content addressed by the language, the css class,
+    the code and the pygments version, in a `CacheStore`.
+    Lexers and formatters are created once per language and css class.
+    With `native_lean`, Lean code is highlighted by `lean_highlight` instead.
+    Code without a language is in `default_language`, or guessed if it is None.
+    """
+
+    version = "1"
+    memory_size = 4096
+    disk_size = 1 << 16
+
+    def __init__(
+        self,
+        cache_path: str | Path | None = None,
+        stats=None,
+        native_lean=False,
+        default_language: str | None = None,
+    ):
+        self.native_lean = native_lean
+        self.default_language = default_language
+        self.stats = stats or BuildStats()
+        self.lexers = {}
+        self.formatters = {}
+        self.store = CacheStore(
+            cache_path, "highlight", self.stats, self.memory_size, self.disk_size
+        )
+
+    def language(self, language, content) -> str:
+        if language != "":
+            return language
+        if self.default_language is not None:
+            return self.default_language
+        return guess_language(content)
+
+    def lexer(self, language):
+        lexer = self.lexers.get(language, None)
+        if lexer is None:
+            lexer = self.lexers[language] = get_lexer_by_name(language)
+        return lexer
+
+    def formatter(self, cssclass):
+        formatter = self.formatters.get(cssclass, None)
+        if formatter is None:
+            formatter = self.formatters[cssclass] = MarkingFormatter(cssclass=cssclass)
+        return formatter
+
+    @property
+    def backend(self) -> str:
+        """The highlighters in use, with their versions"""
+        if self.native_lean:
+            return f"pygments {pygments.__version__}, native {lean_highlight.version}"
+        return f"pygments {pygments.__version__}"
+
+    def is_native(self, language):
+        return self.native_lean and language in LeanLexers
+
+    def key(self, content, language, cssclass):
+        backend = f"pygments {pygments.__version__}"
+        if self.is_native(language):
+            backend = f"native {lean_highlight.version}"
+        return fingerprint(self.version, backend, language, cssclass, content)
+
+    def highlight_uncached(self, content, language, cssclass):
+        with self.stats.timer("highlight"):
+            if self.is_native(language):
+                return highlight_lean(content, cssclass)
+            lexer = self.lexer(language)
+            return highlight(content, lexer, self.formatter(cssclass))
+
+    def highlight(self, content, language, cssclass="highlight") -> str:
+        """Highlighted html, with identifiers marked"""
+        language = self.language(language, content)
+        if any(x in content for x in MarkChars):
+            # not a text we can mark
+            html_code = highlight(
+                content, self.lexer(language), HtmlFormatter(cssclass=cssclass)
+            )
+            return html_code.replace("\x00", "")
+        key = self.key(content, language, cssclass)
+        result = self.store.get(key)
+        if result is None:
+            result = self.highlight_uncached(content, language, cssclass)
+            self.store.put(key, result)
+        return result
+
+    def save(self):
+        self.store.save()
+
+    def close(self):
+        self.store.close()
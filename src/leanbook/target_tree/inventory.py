@@ -0,0 +1,157 @@
+"""Symbol inventory"""
+
+import bisect
+import json
+import mmap
+import struct
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlsplit
+
+MAGIC = b"LEANBOOK-INVENTORY 1\n"
+U32 = struct.Struct("<I")
+
+
+def dump_inventory(
+    entries: dict[str, str], project="", base_url="", block_size=256
+) -> bytes:
+    """
+    Serialize `name -> url` entries.
+
+    The file is the magic line, a JSON header, the offsets of the blocks,
+    the compressed first name of each block, and the blocks themselves:
+    each one is `block_size` sorted `name\\turl` lines, compressed separately,
+    so that a lookup only inflates one block.
+    """
+    names = sorted(x for x in entries if "\t" not in x and "\n" not in x)
+    blocks = []
+    first_names = []
+    for start in range(0, len(names), block_size):
+        chunk = names[start : start + block_size]
+        first_names.append(chunk[0])
+        lines = "".join(f"{x}\t{entries[x]}\n" for x in chunk)
+        blocks.append(zlib.compress(lines.encode(), 9))
+    header = json.dumps(
+        {
+            "project": project,
+            "base_url": base_url,
+            "count": len(names),
+            "blocks": len(blocks),
+        }
+    ).encode()
+    offsets = [0]
+    for block in blocks:
+        offsets.append(offsets[-1] + len(block))
+    keys = zlib.compress("\n".join(first_names).encode(), 9)
+    parts = [
+        MAGIC,
+        U32.pack(len(header)),
+        header,
+        struct.pack(f"<{len(offsets)}Q", *offsets),
+        U32.pack(len(keys)),
+        keys,
+        *blocks,
+    ]
+    return b"".join(parts)
+
+
+class InventoryError(ValueError):
+    pass
+
+
+class Inventory:
+    """
+    A memory-mapped inventory written by `dump_inventory`.
+
+    Opening it reads the header and the first name of each block;
+    a lookup is a binary search over these, then over one inflated block.
+    Recently used blocks are kept inflated.
+    """
+
+    cache_size = 64
+
+    def __init__(self, path: str | Path, base_url: str | None = None):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = self.data
+        if data[: len(MAGIC)] != MAGIC:
+            raise InventoryError(f"{path} is not a leanbook inventory")
+        pos = len(MAGIC)
+        (size,) = U32.unpack_from(data, pos)
+        pos += U32.size
+        self.header = json.loads(data[pos : pos + size])
+        pos += size
+        n_blocks = self.header["blocks"]
+        self.offsets = struct.unpack_from(f"<{n_blocks + 1}Q", data, pos)
+        pos += 8 * (n_blocks + 1)
+        (size,) = U32.unpack_from(data, pos)
+        pos += U32.size
+        keys = zlib.decompress(data[pos : pos + size]).decode()
+        self.first_names = keys.split("\n") if n_blocks else []
+        self.data_start = pos + size
+        if base_url is None:
+            base_url = self.header.get("base_url", "")
+        # urls are relative to the base, which is a directory
+        if base_url and not base_url.endswith("/"):
+            base_url += "/"
+        self.base_url = base_url
+        self.block = lru_cache(maxsize=self.cache_size)(self.read_block)
+
+    @property
+    def project(self) -> str:
+        return self.header.get("project", "")
+
+    def __len__(self):
+        return self.header["count"]
+
+    def close(self):
+        self.block.cache_clear()
+        self.data.close()
+
+    def read_block(self, i) -> tuple[list[str], list[str]]:
+        start = self.data_start + self.offsets[i]
+        end = self.data_start + self.offsets[i + 1]
+        names = []
+        urls = []
+        for line in zlib.decompress(self.data[start:end]).decode().splitlines():
+            name, _, url = line.partition("\t")
+            names.append(name)
+            urls.append(url)
+        return names, urls
+
+    def find(self, name: str) -> str | None:
+        """The URL of `name`, prefixed by the base URL, or None"""
+        i = bisect.bisect_right(self.first_names, name) - 1
+        if i < 0:
+            return None
+        names, urls = self.block(i)
+        k = bisect.bisect_left(names, name)
+        if k < len(names) and names[k] == name:
+            return self.base_url + urls[k]
+        return None
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def __iter__(self):
+        for i in range(len(self.first_names)):
+            names, urls = self.read_block(i)
+            yield from zip(names, urls)
+
+
+def parse_inventory_spec(spec: str) -> Inventory:
+    """
+    Open `PATH` or `PATH=BASE_URL`.
+    The base URL, given in the spec or recorded in the file, must be absolute,
+    since links to it are written into pages at different depths.
+    """
+    path, sep, base_url = spec.partition("=")
+    inventory = Inventory(path, base_url if sep else None)
+    if not urlsplit(inventory.base_url).scheme:
+        inventory.close()
+        raise InventoryError(
+            f"{path} needs an absolute base URL, e.g., {path}=https://example.org/book/"
+        )
+    return inventory
@@ -0,0 +1,147 @@
+"""Lean highlighting without pygments"""
+
+import html
+import re
+
+from ..lean_parser import token
+
+version = "1"
+
+DeclarationCommands = frozenset(
+    x for x in token.Command.names if token.Command(None, x).is_declaration()
+) | {"example", "set_option"}
+ScopeCommands = frozenset(["namespace", "section", "mutual", "end", "import", "open"])
+Keywords = frozenset(token.Command.names) | frozenset(
+    [
+        "at",
+        "by",
+        "calc",
+        "do",
+        "else",
+        "fun",
+        "have",
+        "if",
+        "in",
+        "let",
+        "match",
+        "noncomputable",
+        "private",
+        "protected",
+        "then",
+        "where",
+        "with",
+    ]
+)
+Types = frozenset(["Type", "Prop", "Sort"])
+
+# one alternative for each kind of token, tried in this order
+TokenPattern = re.compile(
+    r"""
+    (?P<ws>\s+)
+    | (?P<open>/-)
+    | (?P<line>--[^\n]*)
+    | (?P<attr>@\[)
+    | (?P<str>"(?:[^"\\]|\\.)*"?)
+    | (?P<char>'(?:[^'\\\n]|\\.[^'\n]*)')
+    | (?P<num>\d+(?:\.\d+)?)
+    | (?P<word>\#?(?:«[^»]*»|[^\W\d])(?:[\w'!?]|\.(?=[^\W\d«]))*(?:«[^»]*»)?)
+    | (?P<op>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+CommentMark = re.compile(r"/-|-/")
+
+
+def comment_end(text, start):
+    """The end of the (nested) block comment at `start`"""
+    depth = 0
+    pos = start
+    while True:
+        match = CommentMark.search(text, pos)
+        if match is None:
+            return len(text)
+        depth += 1 if match[0] == "/-" else -1
+        pos = match.end()
+        if depth == 0:
+            return pos
+
+
+def iter_tokens(text):
+    """
+    `(css class, text)` of Lean code, with the classes of the pygments html formatter.
+    Commands come from `token.Command.names`, like in `lean_parser.lexer`.
+    """
+    pos = 0
+    n = len(text)
+    attr_depth = 0
+    while pos < n:
+        match = TokenPattern.match(text, pos)
+        kind = match.lastgroup
+        value = match[0]
+        if kind == "open":
+            end = comment_end(text, pos)
+            value = text[pos:end]
+            cls = "sd" if value.startswith("/--") else "cm"
+        elif kind == "ws":
+            cls = ""
+        elif kind == "line":
+            cls = "c1"
+        elif kind == "attr":
+            cls = "kd"
+            attr_depth = 1
+        elif kind == "str":
+            cls = "s2"
+        elif kind == "char":
+            cls = "sc"
+        elif kind == "num":
+            cls = "mi"
+        elif kind == "word":
+            if value in DeclarationCommands:
+                cls = "kd"
+            elif value in ScopeCommands:
+                cls = "kn"
+            elif value in Keywords:
+                cls = "k"
+            elif value in Types:
+                cls = "kt"
+            elif value == "sorry":
+                cls = "gr"
+            else:
+                cls = "n"
+        elif attr_depth and value in "[]":
+            attr_depth += 1 if value == "[" else -1
+            cls = "o" if attr_depth else "kd"
+        else:
+            cls = "o"
+        yield cls, value
+        pos += len(value)
+
+
+def highlight_lean(content: str, cssclass="highlight", mark_names=True) -> str:
+    """
+    Html like pygments' `HtmlFormatter` gives, with identifiers marked
+    as `highlight.MarkingFormatter` does.
+    """
+    # like pygments' lexer options `stripnl` and `ensurenl`
+    text = content.strip("\n") + "\n"
+    parts = [f'<div class="{cssclass}"><pre><span></span>']
+    offset = 0
+    last_cls = ""
+    for cls, value in iter_tokens(text):
+        escaped = html.escape(value, quote=False)
+        if cls == "n" and mark_names:
+            escaped = f"\x00{offset}\x02{escaped}\x01"
+        offset += len(value)
+        if cls == last_cls:
+            parts.append(escaped)
+            continue
+        if last_cls:
+            parts.append("</span>")
+        if cls:
+            parts.append(f'<span class="{cls}">')
+        parts.append(escaped)
+        last_cls = cls
+    if last_cls:
+        parts.append("</span>")
+    parts.append("</pre></div>\n")
+    return "".join(parts)
@@ -0,0 +1,93 @@
+"""Build manifest"""
+
+import hashlib
+import json
+from pathlib import Path
+
+
+def fingerprint(*parts) -> str:
+    """Digest of the given parts. Strings and numbers are hashed by their `str`."""
+    digest = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode()
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: Path) -> str:
+    with open(path, "rb") as file:
+        return fingerprint(file.read())
+
+
+class BuildManifest:
+    """
+    The input fingerprints of every output, stored in the output directory.
+
+    Each output records a key, which digests everything it was rendered from,
+    and the symbols it looked up while rendering together with their results.
+    An output is regenerated when it is missing, when its key changes,
+    or when one of its symbols resolves differently.
+    """
+
+    file_name = ".leanbook-manifest.json"
+    version = 2
+
+    def __init__(self, output_dir: str | Path):
+        self.output_dir = Path(output_dir)
+        self.outputs: dict[str, dict] = {}
+        # see `Precompressor`
+        self.compressed: dict[str, list] = {}
+
+    @property
+    def path(self):
+        return self.output_dir / self.file_name
+
+    def load(self):
+        self.outputs.clear()
+        self.compressed.clear()
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.version:
+            return
+        self.outputs.update(data["outputs"])
+        self.compressed.update(data.get("compressed", {}))
+
+    def save(self):
+        data = {"version": self.version, "outputs": self.outputs}
+        if self.compressed:
+            data["compressed"] = self.compressed
+        with open(self.path, "w") as file:
+            json.dump(data, file, indent=1, sort_keys=True)
+
+    def clear(self):
+        self.outputs.clear()
+        self.compressed.clear()
+
+    def is_fresh(self, rel_path, key, probe=None) -> bool:
+        """
+        Whether the output at `rel_path` is still valid.
+        `probe(symbol)` should return the current resolution of a recorded symbol.
+        """
+        entry = self.outputs.get(str(rel_path), None)
+        if entry is None or entry["key"] != key:
+            return False
+        if not (self.output_dir / rel_path).exists():
+            return False
+        symbols = entry.get("symbols", {})
+        if symbols and probe is None:
+            return False
+        for symbol, resolved in symbols.items():
+            if probe(symbol) != resolved:
+                return False
+        return True
+
+    def record(self, rel_path, key, symbols=None):
+        entry = {"key": key}
+        if symbols:
+            entry["symbols"] = dict(symbols)
+        self.outputs[str(rel_path)] = entry
@@ -4,11 +4,10 @@ from mistletoe import block_token, span_token
 from mistletoe.html_renderer import HtmlRenderer
 from mistletoe.span_token import SpanToken
 
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name, guess_lexer
-from pygments.formatters import HtmlFormatter
-
-from .context import DocumentContext
+from .context import DocumentContext, Scope
+from .fragments import Fragment, FragmentCache
+from .highlight import Highlighter, link_names
+from .manifest import fingerprint
 
 
 class BibRef(SpanToken):
@@ -32,20 +31,156 @@ class Math(SpanToken):
         self.math = match.group(1)
 
 
+LeanLanguages = ("lean", "lean4", "lean-source")
+
+
+# link reference definitions, which are given to every element of a document
+RefDefinition = re.compile(r"^ {0,3}\[[^\]]+\]:.*$", re.M)
+
+
 def parse_md(md):
     return mistletoe.Document(md)
 
 
 class MDRender(HtmlRenderer):
-    def __init__(self, ctx: DocumentContext, toc):
+    def __init__(
+        self,
+        ctx: DocumentContext,
+        toc=None,
+        highlighter: Highlighter = None,
+        fragments: FragmentCache = None,
+    ):
         self.toc = toc
         self.ctx = ctx
-        super().__init__(BibRef, Math)
+        self.highlighter = highlighter or Highlighter()
+        self.fragments = fragments
+        # the elements of the document, see `Document.render_elements`
+        self.elements = []
+        # the link reference definitions of all elements
+        self.refs = ""
+        # fragment keys of the elements to render, and fragments of the others
+        self.keys: dict[int, str] = {}
+        self.cached: dict[int, Fragment] = {}
+        # the element being rendered, its scope, and the symbols it resolved
+        self.element = None
+        self.scope = None
+        self.resolutions: dict[str, str | None] = {}
+        # where the toc entries of the element start
+        self.toc_start = 0
+        # what the page and the current element need, such as "math" or "code"
+        self.features: set[str] = set()
+        self.element_features: set[str] = set()
+        super().__init__()
+        # mistletoe registers the tokens of a renderer globally, so they are
+        # added once however many renderers are created
+        for token in (BibRef, Math):
+            span_token.remove_token(token)
+            span_token.add_token(token)
+        self.render_map["BibRef"] = self.render_bib_ref
+        self.render_map["Math"] = self.render_math
+
+    def start_document(self, toc):
+        """Reuse the renderer for another document"""
+        self.toc = toc
+        self.footnotes = {}
+        self.features = set()
+        self.set_elements([])
+
+    def set_elements(self, elements) -> dict[int, Fragment]:
+        """
+        Set the elements of the document. Return the cached fragments by index,
+        whose elements need not be parsed.
+        """
+        self.elements = elements
+        self.keys = {}
+        self.cached = {}
+        self.element = None
+        self.scope = None
+        mds = [x.render_md() for x in elements]
+        self.refs = "\n".join(
+            x for md in mds if md is not None for x in RefDefinition.findall(md)
+        )
+        if self.fragments is None:
+            return self.cached
+        refs = fingerprint(self.refs)
+        for i, (one, md) in enumerate(zip(elements, mds)):
+            key = self.fragments.key(*one.key_parts(), refs if md is not None else "")
+            fragment = self.fragments.get(key)
+            if fragment is None:
+                self.keys[i] = key
+            else:
+                self.cached[i] = fragment
+        return self.cached
+
+    def parse_element(self, md) -> block_token.Document:
+        """
+        Parse the markdown of an element on its own, so that an unclosed fence
+        or html block ends with it, with the references of the whole document.
+        """
+        return parse_md(f"{self.refs}\n\n{md}" if self.refs else md)
+
+    def render_elements(self, documents: list[block_token.Document | None]) -> str:
+        """
+        Render the elements in one fragment each, given their parsed markdown,
+        or None for elements without markdown or with a cached fragment.
+        """
+        fragments = []
+        for index, document in enumerate(documents):
+            children = self.start_fragment(index)
+            if document is not None:
+                self.footnotes.update(document.footnotes)
+                for child in document.children:
+                    html = self.render(child)
+                    if html:
+                        children.append(html)
+            self.end_fragment(index, children, fragments)
+        inner = "\n".join(x for x in fragments if x)
+        return f"{inner}\n" if inner else ""
+
+    def start_fragment(self, index) -> list[str]:
+        self.element = self.elements[index]
+        self.scope = self.element.scope
+        self.resolutions = {}
+        self.toc_start = len(self.toc.list)
+        self.element_features = set()
+        fragment = self.cached.get(index, None)
+        if fragment is not None:
+            self.toc.list.extend(fragment.toc)
+            self.features.update(fragment.features)
+            self.ctx.lookups.update(fragment.resolutions)
+            return [fragment.html] if fragment.html else []
+        if self.element.render_md() is None:
+            html = self.element.render_html(self)
+            return [html] if html else []
+        return []
+
+    def end_fragment(self, index, children, fragments):
+        html = "\n".join(children)
+        fragments.append(html)
+        if index not in self.keys:
+            return
+        toc = self.toc.list[self.toc_start :]
+        fragment = Fragment(html, toc, self.resolutions, self.element_features)
+        self.fragments.put(self.keys[index], fragment)
+
+    def use(self, feature):
+        """Record that the page needs `feature`"""
+        self.features.add(feature)
+        self.element_features.add(feature)
+
+    def resolve(self, symbol, scope: Scope | None) -> str | None:
+        """Resolve a symbol, recording it for the fragment cache"""
+        if scope is None:
+            scope = self.ctx.scope
+        link = self.ctx.resolve(symbol, scope)
+        self.resolutions[f"{scope.signature}|{symbol}"] = link
+        return link
 
     def clear_toc(self):
         self.toc.clear()
 
     def render_bib_ref(self, token: BibRef) -> str:
+        self.use("bibliography")
         inner = self.render_inner(token)
         href = f"#ref_{token.reference}"
         return f'<a href="../references.html{href}">{inner}</a>'
@@ -60,8 +195,9 @@ class MDRender(HtmlRenderer):
         return heading
 
     def render_block_code(self, token: block_token.BlockCode) -> str:
+        self.use("code")
         content = token.content
-        language = token.language
+        language = self.highlighter.language(token.language, content)
 
         cssclass = "highlight"
         if language == "lean-source":
@@ -69,24 +205,47 @@ class MDRender(HtmlRenderer):
             language = "lean"
             cssclass = "highlight source"
 
-        if language == "":
-            lexer = guess_lexer(content)
-        else:
-            lexer = get_lexer_by_name(language)
-        return highlight(content, lexer, HtmlFormatter(cssclass=cssclass))
+        marked = self.highlighter.highlight(content, language, cssclass)
+        if language not in LeanLanguages:
+            return link_names(marked)
+        return self.link_code(content, marked, lambda _: self.scope)
+
+    def render_lean_code(self, element) -> str:
+        """The html of a `LeanCode` element, without going through markdown"""
+        self.use("code")
+        content = element.content
+        marked = self.highlighter.highlight(content, "lean", "highlight source")
+        return self.link_code(content, marked, element.scope_at, element.anchors)
+
+    def link_code(self, content, marked, scope_at, anchors=()):
+        """
+        Link identifiers in highlighted lean code.
+        `scope_at(offset)` gives the scope at an offset of `content`.
+        Each distinct identifier is resolved once per scope.
+        """
+        # the highlighter drops leading newlines
+        lead = len(content) - len(content.lstrip("\n"))
+        anchors = [(i - lead, x, y) for i, x, y in anchors]
+        resolved = {}
+
+        def link(offset, name):
+            scope = scope_at(offset + lead)
+            key = (scope, name)
+            if key not in resolved:
+                resolved[key] = self.resolve(name, scope)
+            return resolved[key]
+
+        return link_names(marked, link, anchors)
 
     def render_inline_code(self, token: span_token.InlineCode) -> str:
         symbol = token.children[0].content
-        resolved = self.ctx.resolve(symbol)
-        if resolved is None:
+        link = self.resolve(symbol, self.scope)
+        if link is None:
             return super().render_inline_code(token)
-        url, pos = resolved
-        anchor = ""
-        if pos is not None:
-            anchor = f"#{symbol}"
-        return f'<a href="{url}{anchor}">{symbol}</a>'
+        return f'<a href="{link}">{symbol}</a>'
 
     def render_math(self, token: Math) -> str:
+        self.use("math")
         if token.content.startswith("$$"):
             return self.render_raw_text(token)
         return f"\\({token.math}\\)"
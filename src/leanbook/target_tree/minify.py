@@ -0,0 +1,107 @@
+"""Whitespace minification of the html and css outputs"""
+
+import re
+
+# where whitespace matters, and where each such region ends
+Protected = re.compile(r"<(pre|script|style|textarea)\b|\\\(|\\\[|\$\$", re.IGNORECASE)
+ClosingTags = {
+    x: re.compile(rf"</{x}\s*>", re.IGNORECASE)
+    for x in ["pre", "script", "style", "textarea"]
+}
+ClosingMath = {
+    "\\(": re.compile(r"\\\)"),
+    "\\[": re.compile(r"\\\]"),
+    "$$": re.compile(r"\$\$"),
+}
+# the longest text that may start a protected region
+Lookahead = len("<textarea") + 1
+LineBreak = re.compile(r"[ \t\r\f\v]*\n\s*")
+Spaces = re.compile(r"[ \t\r\f\v]{2,}")
+
+CssComment = re.compile(r"/\*.*?\*/", re.DOTALL)
+CssSpace = re.compile(r"\s+")
+CssPunctuation = re.compile(r"\s*([{};,>])\s*")
+CssColon = re.compile(r":\s+")
+
+
+def collapse(text: str) -> str:
+    """Whitespace runs as a single line break if they have one, or a space"""
+    return Spaces.sub(" ", LineBreak.sub("\n", text))
+
+
+class HtmlMinifier:
+    """
+    Collapses whitespace in html given in chunks.
+    `<pre>`, `<script>`, `<style>`, `<textarea>` and math, as
+    `\\(..\\)`, `\\[..\\]` or `$$..$$`, are left unchanged.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        # the end of the protected region we are in
+        self.closing: re.Pattern | None = None
+
+    def feed(self, chunk: str, final=False) -> str:
+        self.buffer += chunk
+        out = []
+        while self.buffer:
+            if self.closing is not None:
+                match = self.closing.search(self.buffer)
+                if match is None:
+                    # keep what may be the start of the end
+                    cut = len(self.buffer) if final else len(self.buffer) - Lookahead
+                    if cut > 0:
+                        out.append(self.buffer[:cut])
+                        self.buffer = self.buffer[cut:]
+                    break
+                out.append(self.buffer[: match.end()])
+                self.buffer = self.buffer[match.end() :]
+                self.closing = None
+                continue
+            match = Protected.search(self.buffer)
+            if match is not None and (final or match.end() < len(self.buffer)):
+                out.append(collapse(self.buffer[: match.start()]))
+                out.append(match[0])
+                self.buffer = self.buffer[match.end() :]
+                if match[1] is not None:
+                    self.closing = ClosingTags[match[1].lower()]
+                else:
+                    self.closing = ClosingMath[match[0]]
+                continue
+            if final:
+                out.append(collapse(self.buffer))
+                self.buffer = ""
+                break
+            # keep what may start a protected region, or continue a whitespace run
+            cut = len(self.buffer) - Lookahead
+            if match is not None:
+                cut = min(cut, match.start())
+            cut = len(self.buffer[: max(cut, 0)].rstrip())
+            if cut > 0:
+                out.append(collapse(self.buffer[:cut]))
+                self.buffer = self.buffer[cut:]
+            break
+        return "".join(out)
+
+    def flush(self) -> str:
+        return self.feed("", final=True)
+
+
+def minify_html(chunks):
+    """Minify html given in chunks, as chunks"""
+    minifier = HtmlMinifier()
+    for chunk in chunks:
+        result = minifier.feed(chunk)
+        if result:
+            yield result
+    result = minifier.flush()
+    if result:
+        yield result
+
+
+def minify_css(text: str) -> str:
+    text = CssComment.sub("", text)
+    text = CssSpace.sub(" ", text)
+    text = CssPunctuation.sub(r"\1", text)
+    text = CssColon.sub(":", text)
+    return text.replace(";}", "}").strip() + "\n"
@@ -0,0 +1,82 @@
+"""Gzipped copies of the outputs, for static file servers"""
+
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .manifest import fingerprint
+from .stats import BuildStats
+
+Compressible = (".html", ".css", ".js", ".json", ".svg", ".txt")
+
+
+class Precompressor:
+    """
+    Writes a `.gz` sibling of every text file of the output dir, in a thread pool,
+    since zlib compresses without holding the GIL.
+
+    The state, kept in the build manifest, maps each file to
+    `[size, mtime_ns, level, digest]`: files whose size and mtime are unchanged
+    are not read, and files whose content has the same digest are not compressed
+    again at the same level.
+    """
+
+    def __init__(self, output_dir: str | Path, level=9, stats=None, workers=None):
+        self.output_dir = Path(output_dir)
+        self.level = level
+        self.stats = stats or BuildStats()
+        self.workers = workers
+
+    @staticmethod
+    def gz_path(path: Path) -> Path:
+        return path.with_name(path.name + ".gz")
+
+    def iter_files(self):
+        for path in self.output_dir.rglob("*"):
+            rel_path = path.relative_to(self.output_dir)
+            if any(x.startswith(".") for x in rel_path.parts):
+                continue
+            if path.suffix in Compressible and path.is_file():
+                yield rel_path.as_posix(), path
+
+    def run(self, state: dict[str, list]) -> dict[str, list]:
+        """Compress the changed files. Return the new state."""
+        result = {}
+        todo = []
+        for rel_path, path in self.iter_files():
+            stat = path.stat()
+            signature = [stat.st_size, stat.st_mtime_ns, self.level]
+            old = state.get(rel_path, None)
+            if old is not None and old[:3] == signature and self.gz_path(path).exists():
+                result[rel_path] = old
+            else:
+                todo.append((path, signature, old))
+        with ThreadPoolExecutor(self.workers) as pool:
+            for rel_path, entry, sizes in pool.map(self.compress, todo):
+                result[rel_path] = entry
+                if sizes is not None:
+                    self.stats.count("gzip.in", sizes[0])
+                    self.stats.count("gzip.out", sizes[1])
+        self.remove(state.keys() - result.keys())
+        return result
+
+    def compress(self, item):
+        """`(rel_path, state entry, (size, compressed size) or None)` of a file"""
+        path, signature, old = item
+        rel_path = path.relative_to(self.output_dir).as_posix()
+        data = path.read_bytes()
+        digest = fingerprint(data)
+        gz_path = self.gz_path(path)
+        sizes = None
+        unchanged = old is not None and old[2:] == [self.level, digest]
+        if not unchanged or not gz_path.exists():
+            # no timestamp, so that the same content gives the same file
+            compressed = gzip.compress(data, self.level, mtime=0)
+            gz_path.write_bytes(compressed)
+            sizes = len(data), len(compressed)
+        return rel_path, signature + [digest], sizes
+
+    def remove(self, rel_paths):
+        """Remove the `.gz` files of outputs, e.g., of removed ones"""
+        for rel_path in rel_paths:
+            self.gz_path(self.output_dir / rel_path).unlink(missing_ok=True)
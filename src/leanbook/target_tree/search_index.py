@@ -0,0 +1,188 @@
+"""Search index"""
+
+import json
+import re
+import string
+from collections import Counter
+from pathlib import Path
+
+from .manifest import fingerprint
+
+WordPattern = re.compile(r"\w+")
+
+StopWords = frozenset(
+    [
+        "a",
+        "an",
+        "and",
+        "are",
+        "as",
+        "at",
+        "be",
+        "by",
+        "for",
+        "from",
+        "in",
+        "is",
+        "it",
+        "of",
+        "on",
+        "or",
+        "that",
+        "the",
+        "this",
+        "to",
+        "we",
+        "with",
+    ]
+)
+
+# characters kept as they are in shard file names
+SafeChars = frozenset(string.ascii_lowercase + string.digits)
+
+
+def tokenize(text: str):
+    """
+    Lower case words, and the parts of words joined by `_`.
+    `search.js` splits queries the same way.
+    """
+    for word in WordPattern.findall(text.lower()):
+        if len(word) > 40 or word in StopWords:
+            continue
+        yield word
+        if "_" in word:
+            yield from (x for x in word.split("_") if x and x != word)
+
+
+def shard_key(term: str, prefix_len: int) -> str:
+    """File name friendly key of the shard holding `term`"""
+    prefix = term[:prefix_len]
+    return "".join(c if c in SafeChars else f"_{ord(c):x}" for c in prefix)
+
+
+class SearchIndex:
+    """
+    An inverted index over declarations, headings and module comments,
+    served as static files under `search/`.
+
+    Terms are split into shards by their first characters,
+    and documents (title, URL and kind) into shards by their ids,
+    so the browser only fetches the shards a query needs.
+    The terms of each document are kept in a state file,
+    so a build only re-tokenizes the modules it renders.
+    Ids are kept for URLs that stay, so unchanged shards stay the same.
+    """
+
+    file_name = ".leanbook-search.json"
+    version = 1
+    prefix_len = 2
+    doc_shard_size = 512
+    title_weight = 10
+
+    def __init__(self, output_dir: str | Path):
+        self.output_dir = Path(output_dir)
+        # module -> [id, title, url, kind, {term: weight}] for each document
+        self.modules: dict[str, list[list]] = {}
+        self.free_ids: list[int] = []
+        self.next_id = 0
+
+    @property
+    def path(self):
+        return self.output_dir / self.file_name
+
+    def load(self):
+        self.modules.clear()
+        self.free_ids.clear()
+        self.next_id = 0
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != self.version:
+            return
+        self.modules.update(data["modules"])
+        self.free_ids.extend(data["free_ids"])
+        self.next_id = data["next_id"]
+
+    def save(self):
+        data = {
+            "version": self.version,
+            "modules": self.modules,
+            "free_ids": self.free_ids,
+            "next_id": self.next_id,
+        }
+        with open(self.path, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+
+    def __contains__(self, module_name):
+        return module_name in self.modules
+
+    def new_id(self):
+        if self.free_ids:
+            return self.free_ids.pop()
+        self.next_id += 1
+        return self.next_id - 1
+
+    def update_module(self, module_name, docs):
+        """Replace the documents of a module by `(title, url, kind, text)` tuples"""
+        old_ids = {doc[2]: doc[0] for doc in self.modules.get(module_name, [])}
+        entries = {}
+        for title, url, kind, text in docs:
+            terms = Counter(tokenize(text))
+            for term in tokenize(title):
+                terms[term] += self.title_weight
+            entry = entries.get(url, None)
+            if entry is None:
+                doc_id = old_ids.pop(url, None)
+                if doc_id is None:
+                    doc_id = self.new_id()
+                entries[url] = [doc_id, title, url, kind, dict(terms)]
+            else:
+                entry[4] = dict(terms + Counter(entry[4]))
+        self.free_ids.extend(old_ids.values())
+        self.modules[module_name] = list(entries.values())
+
+    def remove_modules(self, keep):
+        """Drop the modules not in `keep`"""
+        for name in list(self.modules):
+            if name not in keep:
+                self.free_ids.extend(doc[0] for doc in self.modules.pop(name))
+
+    def shards(self) -> dict[str, str]:
+        """Relative paths under `search/` -> JSON contents"""
+        postings: dict[str, dict[str, list]] = {}
+        doc_shards: dict[int, list] = {}
+        size = self.doc_shard_size
+        for docs in self.modules.values():
+            for doc_id, title, url, kind, terms in docs:
+                shard = doc_shards.setdefault(doc_id // size, [None] * size)
+                shard[doc_id % size] = [title, url, kind]
+                for term, weight in terms.items():
+                    key = shard_key(term, self.prefix_len)
+                    postings.setdefault(key, {}).setdefault(term, []).append(
+                        (weight, doc_id)
+                    )
+        result = {}
+        for key, terms in postings.items():
+            data = {}
+            for term in sorted(terms):
+                # the best matches first
+                flat = []
+                for weight, doc_id in sorted(terms[term], key=lambda x: (-x[0], x[1])):
+                    flat += [doc_id, weight]
+                data[term] = flat
+            result[f"t-{key}.json"] = json.dumps(data, separators=(",", ":"))
+        for n, shard in doc_shards.items():
+            while shard[-1] is None:
+                shard.pop()
+            result[f"d-{n}.json"] = json.dumps(shard, separators=(",", ":"))
+        meta = {
+            "version": self.version,
+            "prefix": self.prefix_len,
+            "docs": size,
+            "shards": sorted(postings),
+            "digest": fingerprint(*sorted(result.values())),
+        }
+        result["meta.json"] = json.dumps(meta, separators=(",", ":"))
+        return result
@@ -0,0 +1,67 @@
+"""Build statistics"""
+
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+class BuildStats:
+    """Counters and timers of one build, printed at its end"""
+
+    def __init__(self):
+        self.counters: Counter[str] = Counter()
+        self.timers: defaultdict[str, float] = defaultdict(float)
+
+    def clear(self):
+        self.counters.clear()
+        self.timers.clear()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def hit_rate(self, name) -> str:
+        """`hits/lookups (rate)` of the `{name}.hit` and `{name}.miss` counters"""
+        hits = self.counters[f"{name}.hit"]
+        total = hits + self.counters[f"{name}.miss"]
+        if total == 0:
+            return "no lookups"
+        return f"{hits}/{total} hits ({hits / total:.1%})"
+
+    def size_change(self, name) -> str:
+        """`in -> out bytes (change)` of the `{name}.in` and `{name}.out` counters"""
+        before = self.counters[f"{name}.in"]
+        after = self.counters[f"{name}.out"]
+        if before == 0:
+            return "no bytes"
+        return f"{before} -> {after} bytes ({after / before - 1:+.1%})"
+
+    def report(self):
+        lines = []
+        caches = sorted(
+            {
+                x.rpartition(".")[0]
+                for x in self.counters
+                if x.endswith((".hit", ".miss"))
+            }
+        )
+        for name in caches:
+            lines.append(f"{name} cache: {self.hit_rate(name)}")
+        sizes = sorted(
+            {x.rpartition(".")[0] for x in self.counters if x.endswith((".in", ".out"))}
+        )
+        for name in sizes:
+            lines.append(f"{name}: {self.size_change(name)}")
+        for name, n in sorted(self.counters.items()):
+            if not name.endswith((".hit", ".miss", ".in", ".out")):
+                lines.append(f"{name}: {n}")
+        for name, seconds in sorted(self.timers.items()):
+            lines.append(f"{name}: {seconds:.3f}s")
+        return lines
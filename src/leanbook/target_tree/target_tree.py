@@ -1,29 +1,86 @@
 """Target tree"""
 
-import shutil
+import importlib.metadata
+import io
 import zipfile
+from functools import cache, cached_property
 from pathlib import Path
 import urllib.request
 
-from jinja2 import Environment, PackageLoader, select_autoescape
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    PackageLoader,
+    select_autoescape,
+)
+from jinja2.environment import TemplateStream
 from pybtex.database import parse_file
 from pybtex.plugin import find_plugin
 
 
-from ..source_tree import SourceTree, SourceFile
+from ..source_tree import Navigation, SourceTree, SourceFile
 from .context import DocumentContext
 from .document import Document, remove_solution
+from .fragments import FragmentCache
+from .highlight import Highlighter
+from .md_render import MDRender
+from .minify import minify_css, minify_html
+from .precompress import Precompressor
+from .inventory import dump_inventory
+from .manifest import BuildManifest, fingerprint, file_fingerprint
+from .search_index import SearchIndex
+from .stats import BuildStats
+
+
+inventory_name = "symbols.inv"
+
+
+def is_template(name: str):
+    return not name.endswith((".py", ".pyc"))
+
+
+@cache
+def template_environment(bytecode_dir: Path | None = None) -> Environment:
+    """
+    The template environment shared within a process.
+    With `bytecode_dir`, compiled templates are also kept there across processes,
+    keyed by the template source.
+    """
+    bytecode_cache = None
+    if bytecode_dir is not None:
+        bytecode_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(bytecode_dir))
+    return Environment(
+        loader=PackageLoader("leanbook.target_tree"),
+        autoescape=select_autoescape(),
+        bytecode_cache=bytecode_cache,
+    )
 
 
 class TemplateRenderer:
-    def __init__(self):
-        self.env = Environment(
-            loader=PackageLoader("leanbook.target_tree"), autoescape=select_autoescape()
-        )
+    def __init__(self, bytecode_dir: Path | None = None, stats=None):
+        self.env = template_environment(bytecode_dir)
+        self.stats = stats or BuildStats()
+
+    @cached_property
+    def version(self) -> str:
+        """Digest of the package version and every template"""
+        parts = [importlib.metadata.version("leanbook")]
+        for name in self.env.list_templates(filter_func=is_template):
+            source, _, _ = self.env.loader.get_source(self.env, name)
+            parts += [name, source]
+        return fingerprint(*parts)
+
+    def get_template(self, path):
+        # loading, or compiling on a bytecode cache miss
+        with self.stats.timer("templates"):
+            return self.env.get_template(f"{path}")
 
     def render(self, path, **kwargs) -> str:
-        template = self.env.get_template(f"{path}")
-        return template.render(**kwargs)
+        return self.get_template(path).render(**kwargs)
+
+    def stream(self, path, **kwargs) -> TemplateStream:
+        return self.get_template(path).stream(**kwargs)
 
     def render_index(self, top_modules: dict[Path, str]) -> str:
         data = []
@@ -51,7 +108,27 @@ class TemplateRenderer:
             )
         return self.render("references.html.jinja2", refs=data)
 
-    def render_module(self, title, toc, toc_hint, body):
+    def render_navigation(self, navigation: Navigation) -> str:
+        """The book-wide part of the sidebar, shared by every module page"""
+        items = [
+            {"depth": depth, "href": f"{name}.html", "title": navigation.title(name)}
+            for depth, name in navigation.iter_tree()
+        ]
+        return self.render("navigation.html.jinja2", items=items)
+
+    def render_module(
+        self,
+        title,
+        toc,
+        toc_hint,
+        body,
+        breadcrumbs=(),
+        navigation="",
+        features=frozenset(),
+        path="module.html.jinja2",
+    ) -> TemplateStream:
+        """A module page, or with `path="module.body.html.jinja2"` its fragment"""
+
         def opt_href(x, default=None):
             if x is None:
                 if default is None:
@@ -62,15 +139,21 @@ class TemplateRenderer:
         up_href = opt_href(toc_hint.up, "../index.html")
         prev_href = opt_href(toc_hint.prev)
         next_href = opt_href(toc_hint.next)
+        # fragments of the pages likely to be read next
+        prefetch = [f"{x}.body.html" for x in (toc_hint.next, toc_hint.prev) if x]
 
-        return self.render(
-            "module.html.jinja2",
+        return self.stream(
+            path,
             title=title,
-            toc=toc.iter_html(max_level=3),
+            toc=list(toc.iter_html(max_level=3)),
             body=body,
             up=up_href,
             prev=prev_href,
             next=next_href,
+            breadcrumbs=breadcrumbs,
+            navigation=navigation,
+            features=features,
+            prefetch=prefetch,
         )
 
 
@@ -79,38 +162,210 @@ class TargetTree:
         self.output_dir = Path(output_dir)
         self.source_tree = source_tree
         self.ctx = DocumentContext(source_tree)
-        self.renderer = TemplateRenderer()
+        self.stats = BuildStats()
+        self.renderer = TemplateRenderer(
+            source_tree.cache_dir / "templates", self.stats
+        )
+        self.manifest = BuildManifest(self.output_dir)
+        self.search_index = SearchIndex(self.output_dir)
+        self.highlighter = Highlighter(
+            source_tree.cache_dir / "highlight.sqlite", self.stats
+        )
+        self.fragments = FragmentCache(
+            source_tree.cache_dir / "fragments.sqlite", self.ctx, self.stats
+        )
+        # one markdown renderer for every document
+        self.md_render = MDRender(
+            self.ctx, highlighter=self.highlighter, fragments=self.fragments
+        )
+        # called as `listener(rel_path, data)` for every written output,
+        # and with None as data for every removed one
+        self.listeners = []
+        # regenerate outputs even if they are up to date
+        self.rebuild = False
+        # where the book is published, recorded in its inventory
+        self.base_url = ""
+        # collapse the whitespace of html and css outputs
+        self.minify = False
+        # the gzip level of the `.gz` siblings of text outputs, None for none
+        self.precompress: int | None = None
+        # the sidebar shared by the module pages, see `render_navigation`
+        self.navigation = ""
+        self.navigation_key = ""
 
     def get_path(self, rel_path):
         return self.output_dir / rel_path
 
-    def render_module(self, rel_path: Path):
-        print("rendering", rel_path)
-        source_file: SourceFile = self.source_tree.file_map[rel_path]
+    def output_key(self, key):
+        """The key of an output, with the options changing how it is written"""
+        if self.minify:
+            return fingerprint(key, "minified")
+        return key
+
+    def is_fresh(self, rel_path, key, probe=None):
+        if self.rebuild:
+            return False
+        return self.manifest.is_fresh(rel_path, self.output_key(key), probe)
+
+    def record(self, rel_path, key, symbols=None):
+        self.manifest.record(rel_path, self.output_key(key), symbols)
+
+    def write_output(self, rel_path, content: str | bytes):
+        if isinstance(content, str):
+            if self.minify:
+                content = self.minify_text(rel_path, content)
+            content = content.encode()
+        with open(self.get_path(rel_path), "wb") as file:
+            file.write(content)
+        for listener in self.listeners:
+            listener(str(rel_path), content)
+
+    def remove_output(self, rel_path):
+        self.get_path(rel_path).unlink(missing_ok=True)
+        self.manifest.outputs.pop(str(rel_path), None)
+        for listener in self.listeners:
+            listener(str(rel_path), None)
+
+    def write_stream(self, rel_path, stream: TemplateStream):
+        """Write a template as it is rendered, without holding the whole page"""
+        path = self.get_path(rel_path)
+        chunks = iter(stream)
+        if self.minify:
+            chunks = self.count_size(minify_html(self.count_size(chunks, "in")), "out")
+        with open(path, "wb") as file:
+            file.writelines(chunk.encode() for chunk in chunks)
+        if self.listeners:
+            content = path.read_bytes()
+            for listener in self.listeners:
+                listener(str(rel_path), content)
+
+    def minify_text(self, rel_path, content: str) -> str:
+        if str(rel_path).endswith(".html"):
+            minified = "".join(minify_html([content]))
+        elif str(rel_path).endswith(".css"):
+            minified = minify_css(content)
+        else:
+            return content
+        self.stats.count("minify.in", len(content.encode()))
+        self.stats.count("minify.out", len(minified.encode()))
+        return minified
+
+    def count_size(self, chunks, name):
+        """Count the bytes of the chunks as `minify.{name}`"""
+        for chunk in chunks:
+            self.stats.count(f"minify.{name}", len(chunk.encode()))
+            yield chunk
+
+    def module_key(self, source_file: SourceFile):
         toc_hint = self.source_tree.get_toc_hint(source_file.module_name)
-        document = Document(self.ctx)
-        document.add_elements(source_file.module.element_stream())
+        return fingerprint(
+            self.renderer.version,
+            self.highlighter.backend,
+            self.highlighter.default_language,
+            self.navigation_key,
+            source_file.digest,
+            toc_hint.up,
+            toc_hint.prev,
+            toc_hint.next,
+        )
+
+    def render_module(self, rel_path: Path) -> bool:
+        """Render a module unless it is up to date. Return whether it was rendered."""
+        source_file: SourceFile = self.source_tree.file_map[rel_path]
         module_name = source_file.module_name
-        body = document.html
+        target = f"lean_modules/{module_name}.html"
+        # the page without the parts shared by every page, for `navigate.js`
+        body_target = f"lean_modules/{module_name}.body.html"
+        key = self.module_key(source_file)
+        if (
+            module_name in self.search_index
+            and self.is_fresh(target, key, self.ctx.probe)
+            and self.is_fresh(body_target, key)
+        ):
+            return False
+        print("rendering", rel_path)
+        toc_hint = self.source_tree.get_toc_hint(module_name)
+        self.ctx.reset()
+        document = Document(self.ctx, self.md_render)
+        document.add_elements(source_file.ensure_module().element_stream())
         toc = document.toc
-        html = self.renderer.render_module(module_name, toc, toc_hint, body)
-        with open(
-            self.output_dir / "lean_modules" / f"{module_name}.html", "w"
-        ) as file:
-            file.write(html)
+        navigation = self.source_tree.navigation
+        breadcrumbs = [
+            {"href": f"{x}.html", "title": navigation.title(x)}
+            for x in navigation.breadcrumbs(module_name)
+        ]
+        args = (
+            module_name,
+            toc,
+            toc_hint,
+            document.parts,
+            breadcrumbs,
+            self.navigation,
+            document.features,
+        )
+        self.write_stream(target, self.renderer.render_module(*args))
+        self.record(target, key, self.ctx.lookups)
+        body = self.renderer.render_module(*args, path="module.body.html.jinja2")
+        self.write_stream(body_target, body)
+        self.record(body_target, key)
+        self.search_index.update_module(
+            module_name, self.search_docs(module_name, document)
+        )
+        return True
+
+    @staticmethod
+    def search_docs(module_name, document: Document):
+        """`(title, url, kind, text)` of the searchable parts of a module page"""
+        url = f"lean_modules/{module_name}.html"
+        yield module_name, url, "module", "\n".join(document.comments)
+        for _, title, anchor in document.toc.list:
+            yield title, f"{url}#{anchor}", "heading", ""
+        for name, doc_string in document.declarations:
+            yield name, f"{url}#{module_name}.{name}", "declaration", doc_string
+
+    def write_search_index(self):
+        """Write the shards of the search index that changed, and remove stale ones"""
+        search_dir = self.output_dir / "search"
+        search_dir.mkdir(exist_ok=True)
+        shards = self.search_index.shards()
+        for name, content in shards.items():
+            rel_path = f"search/{name}"
+            key = fingerprint(content)
+            if self.is_fresh(rel_path, key):
+                continue
+            self.write_output(rel_path, content)
+            self.record(rel_path, key)
+        for path in search_dir.iterdir():
+            if path.name.removesuffix(".gz") not in shards:
+                self.remove_output(f"search/{path.name}")
+        self.search_index.save()
 
     def copy_license(self):
         target_path = self.get_path("LICENSE.txt")
+        key = file_fingerprint(self.source_tree.license_path)
+        if self.is_fresh("LICENSE.txt", key):
+            return
         print("copying license to", target_path)
-        shutil.copyfile(
-            src=self.source_tree.license_path, dst=target_path, follow_symlinks=True
-        )
+        with open(self.source_tree.license_path, "rb") as file:
+            self.write_output("LICENSE.txt", file.read())
+        self.record("LICENSE.txt", key)
+
+    def zip_key(self):
+        parts = []
+        for file_path, zip_path in self.source_tree.iter_zip_files():
+            stat = file_path.stat()
+            parts += [zip_path, stat.st_size, stat.st_mtime_ns]
+        return fingerprint(self.renderer.version, *parts)
 
     def zip_source(self):
         name = self.source_tree.dir_name
         target_path = self.get_path(f"{name}.zip")
+        key = self.zip_key()
+        if self.is_fresh(f"{name}.zip", key):
+            return
         print("zip source code to", target_path)
-        with zipfile.ZipFile(target_path, "w") as zip_file:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
             for file_path, zip_path in self.source_tree.iter_zip_files():
                 if file_path.name.startswith("."):
                     continue
@@ -121,16 +376,81 @@ class TargetTree:
                 content = content.encode()
                 with zip_file.open(str(zip_path), "w") as file:
                     file.write(content)
+        self.write_output(f"{name}.zip", buffer.getvalue())
+        self.record(f"{name}.zip", key)
 
     def make_references(self):
         bib_path = self.source_tree.bib_path
-        with open(self.output_dir / "references.html", "w") as file:
-            file.write(self.renderer.render_refs(bib_path))
-        pass
+        key = fingerprint(self.renderer.version, file_fingerprint(bib_path))
+        if self.is_fresh("references.html", key):
+            return
+        self.write_output("references.html", self.renderer.render_refs(bib_path))
+        self.record("references.html", key)
+
+    def inventory_entries(self) -> dict[str, str]:
+        """Lean names of the modules and their declarations -> URLs within the book"""
+        result = {}
+        files = sorted(
+            self.source_tree.iter_read_files(), key=lambda x: x[1].module_name
+        )
+        for _, file in files:
+            name = file.module_name
+            url = f"lean_modules/{name}.html"
+            result.setdefault(name, url)
+            for _, symbol in file.declarations:
+                result.setdefault(symbol, f"{url}#{name}.{symbol}")
+        return result
+
+    def make_inventory(self):
+        """Write the inventory other books can link to"""
+        content = dump_inventory(
+            self.inventory_entries(), self.source_tree.dir_name, self.base_url
+        )
+        key = fingerprint(content)
+        if self.is_fresh(inventory_name, key):
+            return
+        self.write_output(inventory_name, content)
+        self.record(inventory_name, key)
 
-    def render_all(self, force_mathjax=False, with_source=False):
+    def linked_modules(self, module_names) -> set[str]:
+        """Modules that the pages of `module_names` linked to in the last build"""
+        self.manifest.load()
+        result = set()
+        for name in module_names:
+            entry = self.manifest.outputs.get(f"lean_modules/{name}.html", {})
+            for link in entry.get("symbols", {}).values():
+                if link is None or "://" in link:
+                    continue
+                result.add(link.partition("#")[0].removesuffix(".html"))
+        return result
+
+    def render_all(
+        self,
+        force_mathjax=False,
+        with_source=False,
+        rebuild=False,
+        modules=None,
+        first=(),
+    ):
+        """
+        Render every output that is not up to date.
+        If `modules` is given, only these modules are rendered, besides shared assets.
+        Otherwise modules are rendered in dependency order,
+        starting with the modules named in `first`, e.g., the ones affected by a change.
+        """
         # make the output dir
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # outputs whose inputs are unchanged since the last build are skipped
+        self.rebuild = rebuild
+        self.stats.clear()
+        self.fragments.salt = fingerprint(
+            self.renderer.version,
+            self.highlighter.backend,
+            self.highlighter.default_language,
+        )
+        self.render_navigation()
+        self.manifest.load()
+        self.search_index.load()
         # license
         self.copy_license()
         if with_source:
@@ -138,12 +458,63 @@ class TargetTree:
             self.zip_source()
         self.make_references()
         self.render_index(force_mathjax)
-        for rel_path in self.source_tree.file_map:
-            self.render_module(rel_path)
+        up_to_date = 0
+        full = modules is None
+        if full:
+            modules = [x for x, _ in self.source_tree.iter_ordered_files(first)]
+        for rel_path in modules:
+            if not self.render_module(rel_path):
+                up_to_date += 1
+        if up_to_date > 0:
+            print(up_to_date, "modules up to date")
+        if full:
+            # a partial build only knows some of the symbols
+            self.make_inventory()
+            self.search_index.remove_modules(
+                {f.module_name for f in self.source_tree.file_map.values()}
+            )
+            self.remove_stale_modules()
+        self.write_search_index()
+        if self.precompress is not None:
+            self.precompress_outputs()
+        elif self.manifest.compressed:
+            # they would be served instead of the new outputs
+            Precompressor(self.output_dir).remove(self.manifest.compressed)
+            self.manifest.compressed = {}
+        self.manifest.save()
+        self.highlighter.save()
+        self.fragments.save()
+        for line in self.stats.report():
+            print(line)
+
+    def remove_stale_modules(self):
+        """Remove the pages of modules that are no longer in the book"""
+        current = set()
+        for file in self.source_tree.file_map.values():
+            current.add(f"lean_modules/{file.module_name}.html")
+            current.add(f"lean_modules/{file.module_name}.body.html")
+        for rel_path in list(self.manifest.outputs):
+            if rel_path.startswith("lean_modules/") and rel_path not in current:
+                print("removing", rel_path)
+                self.remove_output(rel_path)
+
+    def render_navigation(self):
+        """Render the sidebar of the module pages once for the build"""
+        self.navigation = self.renderer.render_navigation(self.source_tree.navigation)
+        self.navigation_key = fingerprint(self.navigation)
+
+    def precompress_outputs(self):
+        """Write the `.gz` siblings of the text outputs that changed"""
+        precompressor = Precompressor(self.output_dir, self.precompress, self.stats)
+        with self.stats.timer("gzip"):
+            self.manifest.compressed = precompressor.run(self.manifest.compressed)
 
     def render_and_write(self, path, **kwargs):
-        with open(self.output_dir / path, "w") as file:
-            file.write(self.renderer.render(path, **kwargs))
+        key = self.renderer.version
+        if self.is_fresh(path, key):
+            return
+        self.write_output(path, self.renderer.render(path, **kwargs))
+        self.record(path, key)
 
     def render_index(self, force_mathjax):
         """render index.html and file system structures"""
@@ -152,12 +523,19 @@ class TargetTree:
         (self.output_dir / "scripts").mkdir(exist_ok=True, parents=True)
         # copy style and js files
         self.render_and_write("styles/style.css")
+        self.render_and_write("styles/highlight.css")
+        self.render_and_write("scripts/search.js")
+        self.render_and_write("scripts/navigate.js")
         # prepare mathjax
         download_mathjax(self.output_dir / "scripts", force=force_mathjax)
 
         # index
-        with open(self.output_dir / "index.html", "w") as file:
-            file.write(self.renderer.render_index(self.source_tree.top_modules))
+        top_modules = self.source_tree.top_modules
+        key = fingerprint(self.renderer.version, *sorted(map(str, top_modules)))
+        if self.is_fresh("index.html", key):
+            return
+        self.write_output("index.html", self.renderer.render_index(top_modules))
+        self.record("index.html", key)
 
 
 def download_mathjax(script_dir: Path, force):
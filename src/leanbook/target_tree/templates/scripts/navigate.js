@@ -0,0 +1,106 @@
+// follow links between module pages by swapping in their body-only fragments,
+// written next to each page as `<module>.body.html` by leanbook build
+(function () {
+    if (location.protocol === "file:" || !window.fetch || !history.pushState) {
+        return;
+    }
+    // the page shown, which changes without reloading
+    let current = location.pathname;
+    const dir = location.pathname.slice(0, location.pathname.lastIndexOf("/") + 1);
+
+    function fragmentURL(url) {
+        return url.pathname.replace(/\.html$/, ".body.html");
+    }
+
+    function isModulePage(url) {
+        if (url.origin !== location.origin || !url.pathname.startsWith(dir)) {
+            return false;
+        }
+        const name = url.pathname.slice(dir.length);
+        return !name.includes("/") && name.endsWith(".html") && !name.endsWith(".body.html");
+    }
+
+    function setPrefetch(hrefs) {
+        for (const link of document.querySelectorAll('link[rel="prefetch"]')) {
+            link.remove();
+        }
+        for (const href of hrefs) {
+            const link = document.createElement("link");
+            link.rel = "prefetch";
+            link.href = href;
+            document.head.appendChild(link);
+        }
+    }
+
+    function ensureStyle(name) {
+        if (document.querySelector(`link[href$="/styles/${name}"]`)) {
+            return;
+        }
+        const link = document.createElement("link");
+        link.rel = "stylesheet";
+        link.href = `../styles/${name}`;
+        document.head.appendChild(link);
+    }
+
+    async function load(url, push) {
+        const response = await fetch(fragmentURL(url));
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        const html = await response.text();
+        const fragment = new DOMParser().parseFromString(html, "text/html");
+        const page = fragment.getElementById("page");
+        const features = page.dataset.features.split(" ");
+        if (features.includes("math") && !window.MathJax?.typesetPromise) {
+            // MathJax is only loaded by pages with math
+            location.href = url.href;
+            return;
+        }
+        if (features.includes("code")) {
+            ensureStyle("highlight.css");
+        }
+        for (const id of ["page-nav", "page-main"]) {
+            document.getElementById(id).replaceWith(fragment.getElementById(id));
+        }
+        document.title = page.dataset.title;
+        current = url.pathname;
+        setPrefetch(page.dataset.prefetch.split(" ").filter(x => x));
+        if (push) {
+            history.pushState(null, "", url.href);
+        }
+        const target = url.hash && document.getElementById(decodeURIComponent(url.hash.slice(1)));
+        if (target) {
+            target.scrollIntoView();
+        } else {
+            window.scrollTo(0, 0);
+        }
+        if (features.includes("math")) {
+            window.MathJax.typesetPromise([document.getElementById("page-main")]);
+        }
+    }
+
+    function navigate(url, push) {
+        load(url, push).catch(() => { location.href = url.href; });
+    }
+
+    document.addEventListener("click", event => {
+        const a = event.target.closest("a[href]");
+        if (!a || a.target || event.defaultPrevented || event.button !== 0
+            || event.metaKey || event.ctrlKey || event.shiftKey || event.altKey) {
+            return;
+        }
+        const url = new URL(a.href);
+        if (!isModulePage(url) || url.pathname === location.pathname) {
+            return;
+        }
+        event.preventDefault();
+        navigate(url, true);
+    });
+
+    window.addEventListener("popstate", () => {
+        // moving between anchors of a page needs no fragment
+        if (location.pathname !== current) {
+            navigate(new URL(location.href), false);
+        }
+    });
+})();
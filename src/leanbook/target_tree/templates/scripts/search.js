@@ -0,0 +1,121 @@
+// search over the index written under search/ by leanbook build
+(function () {
+    const script = document.currentScript;
+    const root = script.dataset.root;
+    const cache = new Map();
+    let meta = null;
+
+    function fetchJSON(name) {
+        if (!cache.has(name)) {
+            const version = meta ? meta.digest : Date.now();
+            const url = `${root}/search/${name}?v=${version}`;
+            cache.set(name, fetch(url).then(r => r.ok ? r.json() : null));
+        }
+        return cache.get(name);
+    }
+
+    // the same as `StopWords` and `tokenize` in search_index.py
+    const stopWords = new Set(
+        "a an and are as at be by for from in is it of on or that the this to we with"
+            .split(" ")
+    );
+
+    function tokenize(text) {
+        return (text.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [])
+            .filter(x => x.length <= 40 && !stopWords.has(x));
+    }
+
+    function shardKey(term) {
+        return [...term].slice(0, meta.prefix)
+            .map(c => /[a-z0-9]/.test(c) ? c : "_" + c.codePointAt(0).toString(16))
+            .join("");
+    }
+
+    // doc id -> weight for one term, the last one being a prefix
+    async function postings(term, isPrefix) {
+        const key = shardKey(term);
+        const result = new Map();
+        if (!meta.shards.includes(key)) {
+            return result;
+        }
+        const shard = await fetchJSON(`t-${key}.json`) || {};
+        const terms = isPrefix && [...term].length >= meta.prefix
+            ? Object.keys(shard).filter(x => x.startsWith(term))
+            : [term];
+        for (const one of terms) {
+            const flat = shard[one] || [];
+            for (let i = 0; i < flat.length; i += 2) {
+                // exact matches first
+                const weight = one === term ? flat[i + 1] * 2 : flat[i + 1];
+                result.set(flat[i], Math.max(result.get(flat[i]) || 0, weight));
+            }
+        }
+        return result;
+    }
+
+    async function search(query, limit) {
+        meta = meta || await fetchJSON("meta.json");
+        if (!meta) {
+            return [];
+        }
+        const terms = tokenize(query);
+        if (terms.length === 0) {
+            return [];
+        }
+        const lists = await Promise.all(
+            terms.map((x, i) => postings(x, i === terms.length - 1))
+        );
+        // documents matching every term
+        let scores = lists[0];
+        for (const list of lists.slice(1)) {
+            const next = new Map();
+            for (const [id, weight] of scores) {
+                if (list.has(id)) {
+                    next.set(id, weight + list.get(id));
+                }
+            }
+            scores = next;
+        }
+        const best = [...scores].sort((a, b) => b[1] - a[1] || a[0] - b[0])
+            .slice(0, limit);
+        return Promise.all(best.map(async ([id]) => {
+            const shard = await fetchJSON(`d-${Math.floor(id / meta.docs)}.json`);
+            const [title, url, kind] = shard[id % meta.docs];
+            return {title, url: `${root}/${url}`, kind};
+        }));
+    }
+
+    function setup() {
+        const input = document.getElementById("search-input");
+        const results = document.getElementById("search-results");
+        if (!input) {
+            return;
+        }
+        let pending = 0;
+        input.addEventListener("input", async () => {
+            const ticket = ++pending;
+            const found = await search(input.value, 20);
+            if (ticket !== pending) {
+                // a newer query is running
+                return;
+            }
+            results.replaceChildren(...found.map(x => {
+                const item = document.createElement("li");
+                const link = document.createElement("a");
+                link.href = x.url;
+                link.textContent = x.title;
+                const kind = document.createElement("span");
+                kind.className = "search-kind";
+                kind.textContent = x.kind;
+                item.append(link, " ", kind);
+                return item;
+            }));
+        });
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", setup);
+    } else {
+        setup();
+    }
+})();
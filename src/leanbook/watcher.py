@@ -0,0 +1,253 @@
+"""File system watchers, used by `leanbook serve`"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+def iter_tree(path: Path):
+    """All files under `path`, skipping hidden ones"""
+    for one in path.iterdir():
+        if one.name.startswith("."):
+            continue
+        if one.is_dir():
+            yield from iter_tree(one)
+        elif one.is_file():
+            yield one
+
+
+class Watcher(ABC):
+    """
+    Watch a list of directories (recursively) and single files.
+    `wait` blocks until something changes and returns the changed paths.
+    """
+
+    def __init__(self, paths):
+        self.trees: list[Path] = []
+        self.files: set[Path] = set()
+        for path in paths:
+            path = Path(path).absolute()
+            if path.is_dir():
+                self.trees.append(path)
+            else:
+                self.files.add(path)
+
+    def is_watched(self, path: Path):
+        if path in self.files:
+            return True
+        if path.name.startswith("."):
+            return False
+        return any(x == path or x in path.parents for x in self.trees)
+
+    def promote(self, path: Path) -> bool:
+        """
+        Watch a path as a tree if it was missing at startup, and so watched as a file,
+        but is now a directory, e.g., a `lean_lib` created later.
+        """
+        if path in self.files and path.is_dir():
+            self.files.discard(path)
+            self.trees.append(path)
+            return True
+        return False
+
+    @abstractmethod
+    def wait(self, timeout=None) -> set[Path]:
+        pass
+
+    def close(self):
+        pass
+
+    def iter_batches(self, delay=0.05):
+        """
+        Yield sets of changed paths.
+        Changes closer than `delay` seconds are collected into one batch,
+        so an editor saving several files triggers only one rebuild.
+        """
+        while True:
+            changed = self.wait()
+            if not changed:
+                continue
+            while True:
+                more = self.wait(delay)
+                if not more:
+                    break
+                changed |= more
+            yield changed
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, paths, interval=0.2):
+        super().__init__(paths)
+        self.interval = interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        result = {}
+        for path in list(self.files):
+            self.promote(path)
+        paths = list(self.files)
+        for tree in self.trees:
+            if tree.is_dir():
+                paths.extend(iter_tree(tree))
+        for path in paths:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            result[path] = (stat.st_mtime_ns, stat.st_size)
+        return result
+
+    def poll(self) -> set[Path]:
+        snapshot = self.scan()
+        changed = {x for x, v in snapshot.items() if self.snapshot.get(x) != v}
+        changed.update(self.snapshot.keys() - snapshot.keys())
+        self.snapshot = snapshot
+        return changed
+
+    def wait(self, timeout=None):
+        start = time.monotonic()
+        while True:
+            changed = self.poll()
+            if changed:
+                return changed
+            if timeout is not None:
+                rest = timeout - (time.monotonic() - start)
+                if rest <= 0:
+                    return changed
+                time.sleep(min(rest, self.interval))
+            else:
+                time.sleep(self.interval)
+
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher(Watcher):
+    """Linux inotify through ctypes. Every directory of a tree gets its own watch."""
+
+    mask = (
+        IN_MODIFY
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+    )
+
+    def __init__(self, paths):
+        super().__init__(paths)
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.inotify_add_watch = libc.inotify_add_watch
+        self.inotify_add_watch.argtypes = [
+            ctypes.c_int,
+            ctypes.c_char_p,
+            ctypes.c_uint32,
+        ]
+        self.inotify_add_watch.restype = ctypes.c_int
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.dirs: dict[int, Path] = {}
+        for tree in self.trees:
+            self.add_tree(tree)
+        for file in self.files:
+            # the nearest directory that exists, until the others are created
+            parent = file.parent
+            while not parent.is_dir() and parent != parent.parent:
+                parent = parent.parent
+            self.add_dir(parent)
+
+    def add_dir(self, path: Path):
+        wd = self.inotify_add_watch(self.fd, os.fsencode(path), self.mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        self.dirs[wd] = path
+
+    def add_tree(self, path: Path):
+        if not path.is_dir():
+            return
+        self.add_dir(path)
+        for one in path.iterdir():
+            if one.is_dir() and not one.name.startswith("."):
+                self.add_tree(one)
+
+    def read_events(self) -> set[Path]:
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, size = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + size].rstrip(b"\0")
+                offset += size
+                if mask & IN_Q_OVERFLOW:
+                    # events were dropped, report every file as changed,
+                    # and watch the directories we may have missed
+                    for tree in self.trees:
+                        self.add_tree(tree)
+                        if tree.is_dir():
+                            changed.update(iter_tree(tree))
+                    changed.update(self.files)
+                    continue
+                if mask & IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                parent = self.dirs.get(wd, None)
+                if parent is None:
+                    continue
+                path = parent / os.fsdecode(name) if name else parent
+                created = mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+                if created and (self.promote(path) or self.is_watched(path)):
+                    self.add_tree(path)
+                    changed.update(iter_tree(path))
+                elif created and any(path in x.parents for x in self.files):
+                    # on the way to a watched file
+                    self.add_dir(path)
+                if self.is_watched(path):
+                    changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        return self.read_events()
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(paths, poll=False) -> Watcher:
+    """Use inotify where available, and fall back to polling"""
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
@@ -1,3 +1,21 @@
 from .test_parser import *
 from .test_lexer import *
 from .test_module_parser import *
+from .test_manifest import *
+from .test_import_graph import *
+from .test_context import *
+from .test_symbol_index import *
+from .test_symbol_db import *
+from .test_navigation import *
+from .test_inventory import *
+from .test_search_index import *
+from .test_code_links import *
+from .test_lean_highlight import *
+from .test_document import *
+from .test_templates import *
+from .test_minify import *
+from .test_precompress import *
+from .test_target_tree import *
+from .test_source_tree import *
+from .test_server import *
+from .test_watcher import *
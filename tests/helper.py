@@ -1,6 +1,11 @@
+import tempfile
+from pathlib import Path
 from unittest import TestCase
+
 from leanbook.lean_parser.parser import SourceContext, Fail, BaseParser
 
+LAKEFILE = '[[lean_lib]]\nname = "Book"\n'
+
 
 class ParserHelper:
     def __init__(self, test_case: TestCase, parser: BaseParser):
@@ -29,3 +34,19 @@ class ParserHelper:
     def assert_fail(self, text):
         with self.test_case.assertRaises(Fail):
             self.parser.parse_str(text)
+
+
+class PackageTestCase(TestCase):
+    """Tests on a package written to a temporary directory from `files`"""
+
+    files: dict[str, str] = {}
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name)
+        for name, content in self.files.items():
+            (self.path / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.path / name).write_text(content)
+
+    def tearDown(self):
+        self.dir.cleanup()
@@ -0,0 +1,61 @@
+import unittest
+
+import tempfile
+from pathlib import Path
+
+from leanbook.target_tree.context import Scope
+from leanbook.target_tree.document import LeanCode
+from leanbook.target_tree.highlight import Highlighter, link_names
+
+
+class TestCodeLinks(unittest.TestCase):
+    def test_links(self):
+        code = "def add (n : Nat) : Nat := add n\ndef twice := add"
+        calls = []
+
+        def link(offset, name):
+            calls.append((offset, name))
+            return {"add": "A.html#A.add"}.get(name, None)
+
+        anchors = [(0, "add", "A.add"), (34, "twice", "A.twice")]
+        marked = Highlighter().highlight(code, "lean")
+        html = link_names(marked, link, anchors)
+        self.assertEqual(html.count('href="A.html#A.add"'), 3)
+        self.assertEqual(html.count('id="A.add"'), 1)
+        self.assertIn('<a id="A.twice" href="#A.twice">twice</a>', html)
+        self.assertIn((27, "add"), calls)
+        self.assertNotIn("\x00", link_names(marked))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache_path = Path(path) / "highlight.sqlite"
+            highlighter = Highlighter(cache_path)
+            one = highlighter.highlight("end Foo", "lean")
+            self.assertIs(highlighter.highlight("end Foo", "lean"), one)
+            highlighter.highlight("end Foo", "lean", "highlight source")
+            self.assertEqual(
+                highlighter.stats.hit_rate("highlight"), "1/3 hits (33.3%)"
+            )
+            highlighter.save()
+            highlighter.close()
+
+            highlighter = Highlighter(cache_path)
+            self.assertEqual(highlighter.highlight("end Foo", "lean"), one)
+            self.assertEqual(highlighter.stats.counters["highlight.disk"], 1)
+            highlighter.close()
+
+    def test_merged_scopes(self):
+        inner = Scope("M", ("A",))
+        one = LeanCode("namespace A", scope=inner)
+        two = LeanCode("def f := 1", scope=inner, anchors=[(0, "f", "M.A.f")])
+        three = LeanCode("end A", scope=Scope("M"))
+        one.merge(two, three)
+        self.assertEqual(one.content, "namespace A\ndef f := 1\nend A")
+        self.assertEqual(one.anchors, [(12, "f", "M.A.f")])
+        self.assertEqual(one.scope_at(15), inner)
+        self.assertEqual(one.scope_at(23), Scope("M"))
+        self.assertEqual(LeanCode("solution[[rfl]]").content, "sorry")
+
+
+if __name__ == "__main__":
+    unittest.main()
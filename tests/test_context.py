@@ -0,0 +1,68 @@
+import unittest
+
+from leanbook.source_tree import SourceTree
+from leanbook.target_tree.context import DocumentContext, Scope
+
+from .helper import LAKEFILE, PackageTestCase
+
+
+FILES = {
+    "lakefile.toml": LAKEFILE,
+    "Book/A.lean": "namespace Foo\ndef bar := 1\nnamespace Baz\ndef qux := 2\nend Baz\nend Foo\n",
+    "Book/B.lean": "import Book.A\nnamespace Other\ndef bar := 3\nend Other\n",
+}
+
+
+class TestScope(unittest.TestCase):
+    def test_candidates(self):
+        scope = Scope("M", ("A", "B"), ("X",))
+        self.assertEqual(
+            list(scope.candidates("f")),
+            ["A.B.f", "A.f", "f", "A.B.X.f", "A.X.f", "X.f"],
+        )
+        self.assertEqual(Scope.from_signature(scope.signature), scope)
+        self.assertEqual(Scope.from_signature(Scope().signature), Scope())
+
+
+class TestDocumentContext(PackageTestCase):
+    files = FILES
+
+    def setUp(self):
+        super().setUp()
+        self.source_tree = SourceTree(self.path)
+        self.source_tree.build_tree()
+        self.ctx = DocumentContext(self.source_tree)
+
+    def test_resolve(self):
+        ctx = self.ctx
+        ctx.push_scope("Book.B", "module", True)
+        self.assertIsNone(ctx.resolve("bar"))
+        self.assertEqual(ctx.resolve("Foo.bar"), "Book.A.html#Book.A.Foo.bar")
+        self.assertEqual(ctx.resolve("Book.A"), "Book.A.html")
+        ctx.push_scope("Other", "namespace", True)
+        self.assertEqual(ctx.resolve("bar"), "Book.B.html#Book.B.Other.bar")
+        ctx.pop_scope()
+        ctx.push_scope(None, "section")
+        ctx.open(["Foo"])
+        self.assertEqual(ctx.resolve("bar"), "Book.A.html#Book.A.Foo.bar")
+        self.assertEqual(ctx.resolve("Baz.qux"), "Book.A.html#Book.A.Foo.Baz.qux")
+        ctx.pop_scope()
+        # the `open` ends with the section
+        self.assertIsNone(ctx.resolve("bar"))
+
+    def test_probe(self):
+        ctx = self.ctx
+        ctx.push_scope("Book.A", "module", True)
+        ctx.push_scope("Foo.Baz", "namespace", True)
+        ctx.resolve("bar")
+        ctx.resolve("a | b")
+        self.assertEqual(len(ctx.lookups), 2)
+        for key, link in ctx.lookups.items():
+            self.assertEqual(ctx.probe(key), link)
+        self.assertEqual(
+            ctx.lookups["Book.A|Foo.Baz||bar"], "Book.A.html#Book.A.Foo.bar"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
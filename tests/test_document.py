@@ -0,0 +1,105 @@
+import unittest
+from pathlib import Path
+
+from mistletoe import span_token
+
+from leanbook.source_tree import SourceTree
+from leanbook.target_tree.context import DocumentContext
+from leanbook.target_tree.document import Document, LeanCode, ModuleMarkdown
+from leanbook.target_tree.fragments import FragmentCache
+from leanbook.target_tree.md_render import BibRef, Math, MDRender
+
+from .helper import LAKEFILE, PackageTestCase
+
+FILES = {
+    "lakefile.toml": LAKEFILE,
+    "Book/A.lean": (
+        "/-! # Title\nSee `f`. -/\n"
+        "namespace N\ndef f := 1\n/-! Now `f` and $x$. -/\nend N\n"
+        "/-! ```\n<!--leanbook:0-->\n```\n-/\n"
+        'def g := "\n```\n# not a title\n"\n'
+    ),
+    "Book/C.lean": (
+        "/-! Intro\n```lean\nexample := 0\n-/\ndef h := 1\n"
+        "/-! <!-- not closed -/\ndef k := 2\n/-! See `h`. -/\n"
+    ),
+}
+
+
+class TestDocument(PackageTestCase):
+    files = FILES
+
+    def setUp(self):
+        super().setUp()
+        self.source_tree = SourceTree(self.path)
+        self.source_tree.build_tree()
+        self.ctx = DocumentContext(self.source_tree)
+
+    def render(self, renderer, name="Book/A.lean"):
+        file = self.source_tree.file_map[Path(name)]
+        self.ctx.reset()
+        document = Document(self.ctx, renderer)
+        document.add_elements(file.ensure_module().element_stream())
+        return document
+
+    def test_render(self):
+        renderer = MDRender(self.ctx)
+        document = self.render(renderer)
+        html = document.html
+        # `f` is only resolved inside the namespace
+        self.assertIn("<p>See <code>f</code>.</p>", html)
+        self.assertIn('Now <a href="Book.A.html#Book.A.N.f">f</a>', html)
+        self.assertIn('id="Book.A.N.f"', html)
+        self.assertIn("\\(x\\)", html)
+        # placeholders in code are code
+        self.assertIn("leanbook", html)
+        # lean code is not markdown, even with a fence in it
+        self.assertIn("```", html)
+        self.assertNotIn("<h1", html.partition("g</a>")[2])
+        self.assertIn('id="Book.A.g"', html)
+        self.assertEqual(document.toc.list, [(1, "Title", "Title")])
+        self.assertEqual(document.features, {"code", "math"})
+
+        # the renderer is reused, and its tokens are registered once
+        MDRender(self.ctx)
+        for token in (BibRef, Math):
+            self.assertEqual(span_token._token_types.count(token), 1)
+        self.assertEqual(self.render(renderer).html, html)
+
+    def test_fragments(self):
+        fragments = FragmentCache(None, self.ctx)
+        html = self.render(MDRender(self.ctx)).html
+        renderer = MDRender(self.ctx, fragments=fragments)
+        self.assertEqual(self.render(renderer).html, html)
+        misses = fragments.stats.counters["fragments.miss"]
+        document = self.render(renderer)
+        self.assertEqual(document.html, html)
+        self.assertEqual(document.toc.list, [(1, "Title", "Title")])
+        self.assertEqual(document.features, {"code", "math"})
+        self.assertIn("|f", "".join(self.ctx.lookups))
+        self.assertEqual(fragments.stats.counters["fragments.miss"], misses)
+
+        # a new link only invalidates the element using it
+        (self.path / "Book/B.lean").write_text("def f := 2\n")
+        self.source_tree.build_tree()
+        html = self.render(renderer).html
+        self.assertIn('See <a href="Book.B.html#Book.B.f">f</a>', html)
+        self.assertEqual(fragments.stats.counters["fragments.miss"], misses + 1)
+
+    def test_unclosed_markdown(self):
+        # an unclosed fence or html block ends with its comment
+        html = self.render(MDRender(self.ctx), "Book/C.lean").html
+        self.assertIn('id="Book.C.h"', html)
+        self.assertIn('id="Book.C.k"', html)
+        self.assertIn('See <a href="Book.C.html#Book.C.h">h</a>', html)
+        self.assertNotIn("leanbook:", html)
+
+    def test_merge_elements(self):
+        elements = [LeanCode("a"), LeanCode("b"), ModuleMarkdown("c"), LeanCode("d")]
+        merged = list(Document.merge_elements(iter(elements)))
+        self.assertEqual([x.content for x in merged], ["a\nb", "c", "d"])
+        self.assertEqual(list(Document.merge_elements(iter([]))), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from leanbook.source_tree import ImportGraph, ImportCycle
+
+
+class TestImportGraph(unittest.TestCase):
+    def make_graph(self):
+        graph = ImportGraph()
+        graph.add_module("Book", ["Book.A", "Book.B"])
+        graph.add_module("Book.A", ["Mathlib.Data"])
+        graph.add_module("Book.B", ["Book.A"])
+        graph.add_module("Book.C", ["Book.B"])
+        return graph
+
+    def test_order(self):
+        graph = self.make_graph()
+        order = list(graph.iter_ordered())
+        self.assertEqual(sorted(order), ["Book", "Book.A", "Book.B", "Book.C"])
+        for name in order:
+            for one in graph.dependencies(name):
+                self.assertLess(order.index(one), order.index(name))
+        self.assertIsNone(graph.find_cycle())
+
+    def test_dependents(self):
+        graph = self.make_graph()
+        self.assertEqual(graph.dependents("Book.A"), {"Book", "Book.B", "Book.C"})
+        self.assertEqual(
+            graph.dependents("Book.A", transitive=False), {"Book", "Book.B"}
+        )
+        self.assertEqual(graph.dependents("Book.C"), set())
+        self.assertEqual(graph.closure("Book.C"), {"Book.A", "Book.B", "Book.C"})
+
+    def test_cycle(self):
+        graph = self.make_graph()
+        graph.add_module("Book.A", ["Book.C"])
+        cycle = graph.find_cycle()
+        self.assertEqual(cycle[0], cycle[-1])
+        self.assertEqual(set(cycle), {"Book.A", "Book.B", "Book.C"})
+        with self.assertRaises(ImportCycle):
+            list(graph.iter_ordered())
+        # replacing the imports removes the old edges
+        graph.add_module("Book.A", [])
+        self.assertIsNone(graph.find_cycle())
+        self.assertEqual(graph.dependents("Mathlib.Data"), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from leanbook.target_tree import (
+    Inventory,
+    InventoryError,
+    dump_inventory,
+    parse_inventory_spec,
+)
+
+
+class TestInventory(unittest.TestCase):
+    def test_lookup(self):
+        entries = {f"Lib.N{i}.f": f"Lib.N{i}.html#f" for i in range(3000)}
+        entries["Lib"] = "Lib.html"
+        with tempfile.TemporaryDirectory() as path:
+            file_path = Path(path) / "lib.inv"
+            file_path.write_bytes(
+                dump_inventory(entries, "lib", "https://lib.org/", block_size=64)
+            )
+            inventory = Inventory(file_path)
+            self.assertEqual(len(inventory), 3001)
+            self.assertEqual(inventory.project, "lib")
+            self.assertEqual(inventory.find("Lib"), "https://lib.org/Lib.html")
+            self.assertEqual(
+                inventory.find("Lib.N1234.f"), "https://lib.org/Lib.N1234.html#f"
+            )
+            self.assertIsNone(inventory.find("Lib.N1234"))
+            self.assertIsNone(inventory.find("A"))
+            self.assertIsNone(inventory.find("Z"))
+            self.assertEqual(dict(inventory), entries)
+            inventory.close()
+
+            for base_url in ["https://mirror.org/lib/", "https://mirror.org/lib"]:
+                inventory = parse_inventory_spec(f"{file_path}={base_url}")
+                url = inventory.find("Lib")
+                self.assertEqual(url, "https://mirror.org/lib/Lib.html")
+                inventory.close()
+            # relative to the pages, which are not all in the same directory
+            with self.assertRaises(InventoryError):
+                parse_inventory_spec(f"{file_path}=../lib/")
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as path:
+            file_path = Path(path) / "empty.inv"
+            file_path.write_bytes(dump_inventory({}))
+            inventory = Inventory(file_path)
+            self.assertIsNone(inventory.find("x"))
+            inventory.close()
+            # no base URL in the file
+            with self.assertRaises(InventoryError):
+                parse_inventory_spec(str(file_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import re
+import unittest
+
+from leanbook.target_tree.highlight import (
+    Highlighter,
+    NamePattern,
+    guess_language,
+    link_names,
+)
+from leanbook.target_tree.lean_highlight import highlight_lean, iter_tokens
+
+
+class TestLeanHighlight(unittest.TestCase):
+    def test_tokens(self):
+        code = '@[simp] theorem foo : x = "a" := by rfl -- c\n/- a /- b -/ -/ end'
+        tokens = [x for x in iter_tokens(code) if x[0]]
+        self.assertEqual(
+            tokens,
+            [
+                ("kd", "@["),
+                ("n", "simp"),
+                ("kd", "]"),
+                ("kd", "theorem"),
+                ("n", "foo"),
+                ("o", ":"),
+                ("n", "x"),
+                ("o", "="),
+                ("s2", '"a"'),
+                ("o", ":"),
+                ("o", "="),
+                ("k", "by"),
+                ("n", "rfl"),
+                ("c1", "-- c"),
+                ("cm", "/- a /- b -/ -/"),
+                ("kn", "end"),
+            ],
+        )
+
+    def test_like_pygments(self):
+        code = "\n\nnamespace A\ndef f (n : Nat') := Nat.succ n\nend A\n"
+        native = highlight_lean(code, "highlight source")
+        pygments = Highlighter().highlight(code, "lean", "highlight source")
+        # the same text and identifiers at the same offsets
+        self.assertEqual(NamePattern.findall(native), NamePattern.findall(pygments))
+        text = re.sub("<[^>]*>", "", link_names(native))
+        self.assertEqual(text, re.sub("<[^>]*>", "", link_names(pygments)))
+        self.assertTrue(native.startswith('<div class="highlight source"><pre>'))
+
+    def test_highlighter(self):
+        highlighter = Highlighter(native_lean=True)
+        self.assertEqual(
+            highlighter.highlight("def x := 1", "lean"), highlight_lean("def x := 1")
+        )
+        self.assertNotEqual(
+            highlighter.key("x", "lean", "highlight"),
+            Highlighter().key("x", "lean", "highlight"),
+        )
+
+    def test_guess_language(self):
+        self.assertEqual(guess_language("theorem t : 1 = 1 := rfl"), "lean")
+        self.assertEqual(guess_language("example : ∀ n : ℕ, n = n"), "lean")
+        # other code is guessed by pygments
+        self.assertEqual(guess_language("#!/bin/sh\necho hi\n"), "bash")
+        self.assertEqual(guess_language("import os\nprint(os.getcwd())\n"), "python")
+        self.assertEqual(guess_language("just some words"), "text")
+        highlighter = Highlighter(default_language="python")
+        self.assertEqual(highlighter.language("", "x := 1"), "python")
+        self.assertEqual(highlighter.language("lean", "x"), "lean")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from leanbook.target_tree.manifest import BuildManifest, fingerprint
+
+
+class TestManifest(unittest.TestCase):
+    def test_fingerprint(self):
+        self.assertEqual(fingerprint("a", 1), fingerprint("a", "1"))
+        self.assertNotEqual(fingerprint("ab", "c"), fingerprint("a", "bc"))
+        self.assertEqual(fingerprint(b"abc"), fingerprint("abc"))
+
+    def test_fresh(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            manifest = BuildManifest(output_dir)
+            manifest.load()
+            self.assertFalse(manifest.is_fresh("a.html", "key"))
+            manifest.record("a.html", "key", {"x": "a.html#x", "y": None})
+            # the output does not exist yet
+            self.assertFalse(manifest.is_fresh("a.html", "key"))
+            (Path(output_dir) / "a.html").write_text("")
+            manifest.save()
+
+            manifest = BuildManifest(output_dir)
+            manifest.load()
+            resolutions = {"x": "a.html#x", "y": None}
+            self.assertTrue(manifest.is_fresh("a.html", "key", resolutions.get))
+            self.assertFalse(manifest.is_fresh("a.html", "key2", resolutions.get))
+            self.assertFalse(manifest.is_fresh("a.html", "key"))
+            resolutions["y"] = "b.html#y"
+            self.assertFalse(manifest.is_fresh("a.html", "key", resolutions.get))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+from leanbook.target_tree.minify import minify_css, minify_html
+from leanbook.target_tree.stats import BuildStats
+
+HTML = (
+    '<div class="main">\n    <p>Some   text\n\n    and \\( a  +  b \\)</p>\n'
+    '    $$x  \n  y$$\n    <PRE class="x">  keep\n\n   this </PRE>\n\n'
+    "    <script>  // a comment\n  f() </script>   <p>end</p>\n"
+)
+
+
+class TestMinify(unittest.TestCase):
+    def test_html(self):
+        result = "".join(minify_html([HTML]))
+        self.assertEqual(
+            result,
+            '<div class="main">\n<p>Some text\nand \\( a  +  b \\)</p>\n'
+            '$$x  \n  y$$\n<PRE class="x">  keep\n\n   this </PRE>\n'
+            "<script>  // a comment\n  f() </script> <p>end</p>\n",
+        )
+        # the same for any split into chunks
+        for size in range(1, 20):
+            chunks = [HTML[i : i + size] for i in range(0, len(HTML), size)]
+            self.assertEqual("".join(minify_html(chunks)), result)
+
+    def test_css(self):
+        css = "/* c */\na, b > c {\n    color: red;\n    margin: 0 auto;\n}\n"
+        self.assertEqual(minify_css(css), "a,b>c{color:red;margin:0 auto}\n")
+
+    def test_stats(self):
+        stats = BuildStats()
+        stats.count("minify.in", 200)
+        stats.count("minify.out", 150)
+        self.assertIn("minify: 200 -> 150 bytes (-25.0%)", stats.report())
+
+
+if __name__ == "__main__":
+    unittest.main()
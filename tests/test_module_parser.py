@@ -120,6 +120,25 @@ class TestModuleParser(unittest.TestCase):
             ),
         )
 
+    def test_declarations_names(self):
+        text = (
+            "def x := 2\n"
+            "namespace A.B\n"
+            "instance : Inhabited Nat := ⟨0⟩\n"
+            "section S\n"
+            "namespace C\n"
+            "theorem z : True := trivial\n"
+            "end C\n"
+            "end S\n"
+            "end A.B\n"
+            "@[simp] def w := 1\n"
+        )
+        result: Module = module_parser.parse_str(text)
+        self.assertEqual(
+            [name for _, name in result.declarations], ["x", "A.B.C.z", "w"]
+        )
+        self.assertEqual(result.declarations[1][0], SourcePos(79, 6, 1))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from leanbook.source_tree import Navigation
+
+
+class TestNavigation(unittest.TestCase):
+    def test_navigation(self):
+        nav = Navigation()
+        modules = ["B", "B.A", "B.C", "B.C.D", "B.E", "Other", "Orphan", "Orphan.X"]
+        tocs = {
+            "B": [("B.A", "a"), ("B.C", "c"), ("Missing", "m"), ("B.E", "e")],
+            "B.C": [("B.C.D", "d")],
+            "Orphan": [("Orphan.X", "x")],
+        }
+        nav.build(modules, tocs, ["B"])
+        self.assertEqual(
+            nav.order, ["B", "B.A", "B.C", "B.C.D", "B.E", "Orphan", "Orphan.X"]
+        )
+        hint = nav.get_hint("B.C.D")
+        self.assertEqual((hint.up, hint.prev, hint.next), ("B.C", "B.C", "B.E"))
+        hint = nav.get_hint("B")
+        self.assertEqual((hint.up, hint.prev, hint.next), (None, None, "B.A"))
+        # not in any TOC
+        hint = nav.get_hint("Other")
+        self.assertEqual((hint.up, hint.prev, hint.next), (None, None, None))
+        self.assertEqual(nav.get_hint("Missing").up, "B")
+
+        self.assertEqual(nav.breadcrumbs("B.C.D"), ["B", "B.C"])
+        self.assertEqual(nav.title("B.C"), "c")
+        self.assertEqual(nav.title("B"), "B")
+        self.assertEqual(
+            list(nav.iter_tree())[:5],
+            [(0, "B"), (1, "B.A"), (1, "B.C"), (2, "B.C.D"), (1, "B.E")],
+        )
+
+    def test_cycle(self):
+        nav = Navigation()
+        nav.build(["A", "B"], {"A": [("B", "b")], "B": [("A", "a")]}, ["A"])
+        self.assertEqual(nav.order, ["A", "B"])
+        self.assertEqual(nav.breadcrumbs("A"), ["B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import gzip
+import tempfile
+import unittest
+from pathlib import Path
+
+from leanbook.target_tree.precompress import Precompressor
+
+
+class TestPrecompress(unittest.TestCase):
+    def test_precompress(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp)
+            (path / "search").mkdir()
+            (path / "index.html").write_text("<p>index</p>" * 100)
+            (path / "search/meta.json").write_text("{}")
+            (path / "font.woff").write_bytes(b"woff")
+            (path / ".leanbook-manifest.json").write_text("{}")
+
+            precompressor = Precompressor(path, level=6, workers=2)
+            state = precompressor.run({})
+            self.assertEqual(sorted(state), ["index.html", "search/meta.json"])
+            data = gzip.decompress((path / "index.html.gz").read_bytes())
+            self.assertEqual(data.decode(), "<p>index</p>" * 100)
+            self.assertFalse((path / "font.woff.gz").exists())
+            self.assertEqual(precompressor.stats.counters["gzip.in"], 1202)
+
+            # unchanged content is not compressed again, even if it was written
+            (path / "search/meta.json").write_text("{}")
+            precompressor.stats.clear()
+            state = precompressor.run(state)
+            self.assertEqual(precompressor.stats.counters["gzip.in"], 0)
+
+            (path / "search/meta.json").write_text('{"a": 1}')
+            (path / "index.html").unlink()
+            (path / "archive.tar.gz").write_bytes(b"")
+            state = precompressor.run(state)
+            self.assertEqual(precompressor.stats.counters["gzip.in"], 8)
+            self.assertEqual(list(state), ["search/meta.json"])
+            self.assertFalse((path / "index.html.gz").exists())
+
+            # only the files it wrote are removed
+            self.assertTrue((path / "archive.tar.gz").exists())
+            precompressor.remove(state)
+            self.assertFalse((path / "search/meta.json.gz").exists())
+            self.assertTrue((path / "archive.tar.gz").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import unittest
+
+from leanbook.target_tree.search_index import SearchIndex, shard_key, tokenize
+
+
+class TestSearchIndex(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            list(tokenize("The Nat.add_zero lemma")),
+            ["nat", "add_zero", "add", "zero", "lemma"],
+        )
+        self.assertEqual(shard_key("add", 2), "ad")
+        self.assertEqual(shard_key("α", 2), "_3b1")
+
+    def test_shards(self):
+        index = SearchIndex("unused")
+        index.update_module(
+            "A",
+            [
+                ("A", "A.html", "module", "about addition"),
+                ("add", "A.html#A.add", "declaration", "adds two numbers"),
+            ],
+        )
+        index.update_module("B", [("B", "B.html", "module", "add more")])
+        shards = index.shards()
+        meta = json.loads(shards["meta.json"])
+        self.assertIn("ad", meta["shards"])
+        terms = json.loads(shards["t-ad.json"])
+        # the title match comes first
+        self.assertEqual(terms["add"], [1, 10, 2, 1])
+        self.assertEqual(terms["addition"], [0, 1])
+        docs = json.loads(shards["d-0.json"])
+        self.assertEqual(docs[1], ["add", "A.html#A.add", "declaration"])
+
+        # ids of unchanged URLs are kept, others are reused
+        index.update_module("A", [("A", "A.html", "module", "")])
+        index.remove_modules({"A"})
+        self.assertEqual(index.modules["A"][0][0], 0)
+        self.assertEqual(sorted(index.free_ids), [1, 2])
+        index.update_module("C", [("C", "C.html", "module", "")])
+        self.assertEqual(index.next_id, 3)
+        self.assertNotIn("t-ad.json", index.shards())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import gzip
+import unittest
+
+from leanbook.server import (
+    PageStore,
+    PreviewServer,
+    Request,
+    accepts_gzip,
+    parse_range,
+)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def response(self):
+        head, _, body = self.data.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = dict(x.split(": ", 1) for x in lines[1:])
+        return status, headers, body
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.store = PageStore()
+        self.changed = []
+        self.store.listeners.append(self.changed.append)
+        self.server = PreviewServer(self.store)
+        self.data = b"<p>page</p>" * 100
+        self.store.put("a.css", self.data)
+
+    def get(self, path, **headers):
+        writer = FakeWriter()
+        request = Request("GET", path, "HTTP/1.1", headers)
+        asyncio.run(self.server.serve_page(writer, request, path))
+        return writer.response()
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(parse_range("bytes=50-200", 100), (50, 99))
+        for value in [
+            "bytes=100-",
+            "bytes=9-0",
+            "bytes=-0",
+            "items=0-1",
+            "bytes=0-1,3-4",
+        ]:
+            self.assertIsNone(parse_range(value, 100), value)
+
+    def test_accepts_gzip(self):
+        self.assertTrue(accepts_gzip("gzip, deflate"))
+        self.assertTrue(accepts_gzip("br;q=1.0, gzip;q=0.5"))
+        self.assertTrue(accepts_gzip("*"))
+        self.assertTrue(accepts_gzip("*;q=0, gzip"))
+        self.assertFalse(accepts_gzip("gzip;q=0, *"))
+        self.assertFalse(accepts_gzip("gzip;q=0.000"))
+        self.assertFalse(accepts_gzip("deflate"))
+        self.assertFalse(accepts_gzip(""))
+
+    def test_responses(self):
+        status, headers, body = self.get("/a.css")
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.data)
+        etag = headers["ETag"]
+        self.assertEqual(self.get("/a.css", **{"if-none-match": etag})[0], 304)
+
+        status, headers, body = self.get("/a.css", **{"accept-encoding": "gzip"})
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), self.data)
+        self.assertNotEqual(headers["ETag"], etag)
+
+        status, headers, body = self.get("/a.css", range="bytes=0-9")
+        self.assertEqual(status, 206)
+        self.assertEqual(headers["Content-Range"], "bytes 0-9/1100")
+        self.assertEqual(body, self.data[:10])
+        # a range of another version of the page gives all of it
+        status, _, _ = self.get("/a.css", range="bytes=0-9", **{"if-range": '"x"'})
+        self.assertEqual(status, 200)
+        self.assertEqual(self.get("/a.css", range="bytes=2000-")[0], 416)
+
+    def test_remove(self):
+        self.store.put("a.css", None)
+        self.assertEqual(self.changed, ["a.css", "a.css"])
+        self.assertEqual(self.get("/a.css")[0], 404)
+        self.store.remove("a.css")
+        self.assertEqual(len(self.changed), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
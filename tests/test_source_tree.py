@@ -0,0 +1,66 @@
+import unittest
+from pathlib import Path
+
+from leanbook.source_tree import SourceTree
+
+from .helper import LAKEFILE, PackageTestCase
+
+FILES = {
+    "lakefile.toml": LAKEFILE,
+    "Book.lean": (
+        "import Book.A\nimport Book.C\n/-TOC-/\n/-!\n- `Book.A`: a\n- `Book.B`: b\n"
+        "- `Book.C`: c\n-/\n"
+    ),
+    "Book/A.lean": "def f := 1\n",
+    "Book/B.lean": "import Book.A\ndef g := f\n",
+    "Book/C.lean": "import Book.B\ndef h := g\n",
+}
+
+
+class TestSourceTree(PackageTestCase):
+    files = FILES
+
+    def setUp(self):
+        super().setUp()
+
+    def build_partial(self, patterns, linked_modules=None):
+        tree = SourceTree(self.path)
+        selected = tree.build_partial(patterns, linked_modules)
+        loaded = {f.module_name for _, f in tree.iter_read_files()}
+        tree.symbol_db.close()
+        return tree, selected, loaded
+
+    def test_partial(self):
+        # without a symbol database, the TOC is found in the text
+        tree, selected, loaded = self.build_partial(["Book.B"])
+        self.assertEqual(selected, [Path("Book/B.lean")])
+        self.assertEqual(loaded, {"Book", "Book.A", "Book.B"})
+        self.assertEqual(tree.get_toc_hint("Book.B").next, "Book.C")
+
+        tree = SourceTree(self.path)
+        tree.build_tree()
+        tree.symbol_db.close()
+        # the TOC comes from the database, and imports are only followed
+        # from the selected modules
+        tree, selected, loaded = self.build_partial(["Book.B"], lambda _: {"Book.C"})
+        self.assertEqual(loaded, {"Book.A", "Book.B", "Book.C"})
+        hint = tree.get_toc_hint("Book.B")
+        self.assertEqual((hint.up, hint.prev, hint.next), ("Book", "Book.A", "Book.C"))
+        self.assertIn("Book.A.f", tree.symbol_index)
+
+        tree, selected, loaded = self.build_partial(["Book.A", "Book.Z*"])
+        self.assertEqual(selected, [Path("Book/A.lean")])
+        self.assertEqual(loaded, {"Book.A"})
+
+    def test_affected_order(self):
+        tree = SourceTree(self.path)
+        tree.build_tree()
+        tree.symbol_db.close()
+        affected = tree.affected_modules({"Book.B"})
+        self.assertEqual(affected, {"Book", "Book.B", "Book.C"})
+        order = [f.module_name for _, f in tree.iter_ordered_files(affected)]
+        self.assertEqual(order, ["Book.B", "Book.C", "Book", "Book.A"])
+
+
+if __name__ == "__main__":
+    unittest.main()
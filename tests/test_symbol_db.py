@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from leanbook.source_tree import SourceTree
+
+LAKEFILE = """
+name = "book"
+
+[[lean_lib]]
+name = "Book"
+"""
+
+BOOK = """
+import Book.A
+/-TOC-/
+/-!
+* `Book.A`: A
+-/
+"""
+
+MODULE_A = """
+namespace N
+def f := 1
+end N
+"""
+
+
+class TestSymbolDatabase(unittest.TestCase):
+    def make_tree(self, path: Path):
+        (path / "lakefile.toml").write_text(LAKEFILE)
+        (path / "Book.lean").write_text(BOOK)
+        (path / "Book").mkdir()
+        (path / "Book" / "A.lean").write_text(MODULE_A)
+
+    def test_reuse(self):
+        with tempfile.TemporaryDirectory() as path:
+            path = Path(path)
+            self.make_tree(path)
+            tree = SourceTree(path)
+            tree.build_tree()
+            self.assertIn("Book.A.N.f", tree.symbol_index)
+            parsed = SourceTree(path)
+            parsed.build_tree()
+            parsed.symbol_db.close()
+            tree.symbol_db.close()
+
+            tree = SourceTree(path)
+            tree.build_tree()
+            files = {f.module_name: f for f in tree.file_map.values()}
+            # nothing was parsed again
+            self.assertTrue(all(f.module is None for f in files.values()))
+            self.assertEqual(files["Book"].imports, ["Book.A"])
+            self.assertEqual(
+                files["Book.A"].declarations,
+                parsed.file_map[Path("Book/A.lean")].declarations,
+            )
+            self.assertEqual(tree.toc_hints["Book.A"].up, "Book")
+            self.assertIn("Book.A.N.f", tree.symbol_index)
+            self.assertIsNotNone(files["Book.A"].ensure_module())
+
+            # changed files are parsed, removed ones are dropped
+            (path / "Book" / "A.lean").write_text("def g := 2\n")
+            (path / "Book.lean").write_text("")
+            tree.symbol_db.close()
+            tree = SourceTree(path)
+            tree.build_tree()
+            self.assertNotIn("Book.A.N.f", tree.symbol_index)
+            self.assertIn("Book.A.g", tree.symbol_index)
+            (path / "Book" / "A.lean").unlink()
+            tree.build_tree()
+            self.assertEqual(tree.symbol_db.digests().keys(), {"Book"})
+            names = tree.symbol_db.conn.execute("SELECT name FROM symbols").fetchall()
+            self.assertEqual(names, [])
+            tree.symbol_db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import pickle
+import unittest
+
+from leanbook.lean_parser import SourcePos
+from leanbook.source_tree import SymbolIndex
+
+
+class TestSymbolIndex(unittest.TestCase):
+    def make_index(self):
+        index = SymbolIndex()
+        index.add("B.lean", "B", None)
+        index.add("B.lean", "B.Foo.bar", SourcePos(10, 2, 1))
+        index.add("A.lean", "A", None)
+        index.add("A.lean", "A.x", SourcePos(3, 1, 4))
+        index.add("A.lean", "A.xy.z", SourcePos(20, 3, 1))
+        index.add("A.lean", "A.x.y", SourcePos(30, 4, 1))
+        index.add("B.lean", "B.Foo.baz", SourcePos(40, 5, 1))
+        # overrides the first one
+        index.add("B.lean", "B.Foo.bar", SourcePos(50, 6, 1))
+        return index
+
+    def test_find(self):
+        index = self.make_index()
+        self.assertEqual(len(index), 7)
+        self.assertIsNone(index.find("A.y"))
+        self.assertIsNone(index.find("B.Foo"))
+        self.assertIsNone(index.find("A").source_pos)
+        self.assertEqual(index.find("A").rel_path, "A.lean")
+        found = index.find("B.Foo.bar")
+        self.assertEqual(found.rel_path, "B.lean")
+        self.assertEqual(found.source_pos, SourcePos(50, 6, 1))
+        self.assertIn("A.x.y", index)
+
+    def test_prefix(self):
+        index = self.make_index()
+        self.assertEqual(list(index.iter_prefix("A.x")), ["A.x", "A.x.y", "A.xy.z"])
+        self.assertEqual(list(index.iter_namespace("A")), ["A.x", "A.xy"])
+        self.assertEqual(
+            list(index.iter_namespace("B.Foo")), ["B.Foo.bar", "B.Foo.baz"]
+        )
+        self.assertEqual(list(index.iter_namespace("")), ["A", "B"])
+        self.assertEqual(list(index.iter_namespace("C")), [])
+        self.assertEqual(
+            sorted(index.iter_declared("B.lean")), ["B", "B.Foo.bar", "B.Foo.baz"]
+        )
+
+    def test_namespace_siblings(self):
+        # `!` and `'` sort before `.`
+        index = SymbolIndex()
+        for name in ["A.x", "A.x!", "A.x'", "A.x.y", "A.x?", "A.x!.z", "A.w!", "A.w.v"]:
+            index.add("A.lean", name, None)
+        self.assertEqual(
+            list(index.iter_namespace("A")),
+            ["A.w!", "A.w", "A.x", "A.x!", "A.x'", "A.x?"],
+        )
+        self.assertEqual(list(index.iter_namespace("A.x!")), ["A.x!.z"])
+
+    def test_snapshot(self):
+        index = self.make_index()
+        for copy in [
+            SymbolIndex.loads(index.dumps()),
+            pickle.loads(pickle.dumps(index)),
+        ]:
+            self.assertEqual(copy.names, index.names)
+            self.assertEqual(copy.find("A.x.y"), index.find("A.x.y"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from pathlib import Path
+
+from leanbook.source_tree import SourceTree
+from leanbook.target_tree.target_tree import TargetTree
+
+from .helper import LAKEFILE, PackageTestCase
+
+FILES = {
+    "lakefile.toml": LAKEFILE,
+    "Book.lean": "/-TOC-/\n/-!\n- `Book.A`: a\n- `Book.B`: b\n-/\n",
+    "Book/A.lean": "/-! # A\nMath $x$. -/\ndef f := 1\n",
+    "Book/B.lean": "def g := 2\n",
+}
+
+
+class TestTargetTree(PackageTestCase):
+    files = FILES
+
+    def setUp(self):
+        super().setUp()
+        source_tree = SourceTree(self.path)
+        source_tree.build_tree()
+        self.target_tree = TargetTree(source_tree, self.path / "out")
+        (self.path / "out/lean_modules").mkdir(parents=True)
+
+    def tearDown(self):
+        self.target_tree.highlighter.close()
+        self.target_tree.fragments.close()
+        super().tearDown()
+
+    def test_body_fragment(self):
+        target_tree = self.target_tree
+        target_tree.render_navigation()
+        self.assertTrue(target_tree.render_module(Path("Book/A.lean")))
+        outputs = target_tree.manifest.outputs
+        page = outputs["lean_modules/Book.A.html"]
+        self.assertEqual(outputs["lean_modules/Book.A.body.html"]["key"], page["key"])
+
+        body = target_tree.get_path("lean_modules/Book.A.body.html").read_text()
+        self.assertTrue(body.startswith('<div id="page" data-title="Book.A"'))
+        self.assertIn('data-features="code math"', body)
+        # the next page, then the previous one
+        self.assertIn('data-prefetch="Book.B.body.html Book.body.html"', body)
+        self.assertIn('id="page-nav"', body)
+        self.assertIn('id="Book.A.f"', body)
+        self.assertNotIn("<html", body)
+        self.assertFalse(target_tree.render_module(Path("Book/A.lean")))
+
+    def test_remove_stale_modules(self):
+        target_tree = self.target_tree
+        target_tree.render_navigation()
+        target_tree.render_module(Path("Book/B.lean"))
+        page = target_tree.get_path("lean_modules/Book.B.html")
+        self.assertTrue(page.exists())
+
+        source_tree = target_tree.source_tree
+        (source_tree.path / "Book/B.lean").unlink()
+        source_tree.update([])
+        removed = []
+        target_tree.listeners.append(lambda x, data: removed.append((x, data)))
+        target_tree.remove_stale_modules()
+        self.assertIn(("lean_modules/Book.B.html", None), removed)
+        self.assertFalse(page.exists())
+        self.assertFalse(page.with_name("Book.B.body.html").exists())
+        self.assertEqual(target_tree.manifest.outputs, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from leanbook.target_tree.stats import BuildStats
+from leanbook.target_tree.target_tree import TemplateRenderer
+
+
+class TestTemplates(unittest.TestCase):
+    def test_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            bytecode_dir = Path(tmp) / "templates"
+            stats = BuildStats()
+            renderer = TemplateRenderer(bytecode_dir, stats)
+            # the environment is shared within the process
+            self.assertIs(TemplateRenderer(bytecode_dir).env, renderer.env)
+            self.assertIsNot(TemplateRenderer().env, renderer.env)
+
+            css = renderer.render("styles/style.css")
+            self.assertTrue(any(bytecode_dir.iterdir()))
+            self.assertIn("templates", stats.timers)
+
+            # a fresh environment loads the compiled template
+            renderer.env.cache.clear()
+            self.assertEqual(renderer.render("styles/style.css"), css)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from leanbook.watcher import PollingWatcher, make_watcher
+
+from .helper import LAKEFILE, PackageTestCase
+
+
+class TestWatcher(PackageTestCase):
+    files = {"lakefile.toml": LAKEFILE, "Book/A.lean": "def f := 1\n"}
+
+    def check(self, watcher):
+        path = self.path
+        self.assertEqual(watcher.wait(0), set())
+
+        (path / "Book/B.lean").write_text("def g := 1\n")
+        self.assertEqual(watcher.wait(1), {path / "Book/B.lean"})
+        (path / "Book/A.lean").write_text("def f := 2\n")
+        self.assertIn(path / "Book/A.lean", watcher.wait(1))
+        (path / "Book/B.lean").unlink()
+        self.assertEqual(watcher.wait(1), {path / "Book/B.lean"})
+        # not watched
+        (path / "README.md").write_text("")
+        (path / "Book/.A.lean.swp").write_text("")
+        self.assertEqual(watcher.wait(0.3), set())
+
+        # a directory missing at startup
+        (path / "Other/Sub").mkdir(parents=True)
+        (path / "Other/Sub/C.lean").write_text("def h := 1\n")
+        changed = set()
+        while path / "Other/Sub/C.lean" not in changed:
+            more = watcher.wait(1)
+            self.assertTrue(more)
+            changed |= more
+        self.assertTrue(all(watcher.is_watched(x) for x in changed))
+        self.assertIn(path / "Other", watcher.trees)
+
+    def test_polling(self):
+        watcher = PollingWatcher(self.watch_paths(), interval=0.01)
+        self.check(watcher)
+        watcher.close()
+
+    def test_default(self):
+        # inotify where available
+        watcher = make_watcher(self.watch_paths())
+        self.check(watcher)
+        watcher.close()
+
+    def watch_paths(self):
+        return [self.path / "lakefile.toml", self.path / "Book", self.path / "Other"]
+
+
+if __name__ == "__main__":
+    unittest.main()